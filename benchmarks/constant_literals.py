@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Checks that every compilation path reads integer constants the way C does.
+
+Builds small programs returning octal, large and wrapping constants with
+gcc as the reference, then with the driver in each mode that computes or
+encodes constant values itself, and compares the exit statuses.
+
+Exits with status 1 if anything disagrees.
+
+usage: python3 benchmarks/constant_literals.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+DRIVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "driver.py")
+
+CONSTANTS = ["0", "00", "07", "010", "0777", "017777777777", "020000000000", "037777777777", "4294967297",
+             "9223372036854775808", "18446744073709551615"]
+
+EXPRESSIONS = ["{}", "-{}", "~{}", "-~{}"]
+
+# driver options; each builds an executable from the same source, except
+# for those that evaluate the program in process and exit with its status
+MODES = [
+    [],
+    ["-O"],
+    ["--dense-tacky"],
+    ["--integrated-as"],
+    ["--run"],
+    ["-O", "--run"],
+    ["--interpret"],
+]
+
+IN_PROCESS = {"--run", "--interpret"}
+
+def exit_status(cmd):
+    return subprocess.run(cmd, capture_output=True).returncode
+
+def main():
+    mismatches = 0
+    checked = 0
+    with tempfile.TemporaryDirectory() as directory:
+        source_file = os.path.join(directory, "constant.c")
+        executable = os.path.join(directory, "constant")
+        for constant in CONSTANTS:
+            for expression in EXPRESSIONS:
+                source = f"int main(void) {{\n    return {expression.format(constant)};\n}}\n"
+                with open(source_file, "w") as f:
+                    f.write(source)
+
+                if exit_status(["gcc", "-w", source_file, "-o", executable]) != 0:
+                    print(f"gcc failed on {source!r}")
+                    return 1
+                expected = exit_status([executable])
+
+                for mode in MODES:
+                    status = exit_status([sys.executable, DRIVER, *mode, source_file])
+                    if IN_PROCESS.intersection(mode):
+                        actual = status
+                    elif status != 0:
+                        actual = "build failed"
+                    else:
+                        actual = exit_status([executable])
+                    checked += 1
+                    if actual != expected:
+                        mismatches += 1
+                        print(f"MISMATCH {' '.join(mode) or 'default'}: {actual} != {expected}\n{source}")
+
+    print(f"{checked} builds, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
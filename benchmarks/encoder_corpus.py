@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Built-in encoder check against the system assembler.
+
+Compiles a corpus of programs (every shape in benchmarks/programs.py at a
+few sizes, with and without -O), assembles the emitted text with `as` and
+compares the resulting .text section byte for byte against
+encoder.object_bytes. Also reports the mean time of each route: running
+`as` over the text, and encoding directly.
+
+Exits with status 1 if any program encodes differently.
+
+usage: python3 benchmarks/encoder_corpus.py [--sizes 1,10,100]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import compiler
+import encoder
+
+import programs
+
+DEFAULT_SIZES = [1, 2, 10, 100, 1000]
+
+# constants whose text as reads differently from int(): octal ones, and
+# ones it truncates to 32 bits or rejects
+CONSTANTS = ["00", "07", "010", "037777777777", "4294967297", "18446744073709551615", "18446744073709551616"]
+
+def corpus(sizes: list):
+    for shape, generate in programs.GENERATORS.items():
+        for size in sizes:
+            yield f"{shape}/{size}", generate(size)
+    for constant in CONSTANTS:
+        yield f"constant/{constant}", f"int main(void) {{\n    return -{constant};\n}}\n"
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    options = arg_parser.parse_args()
+    sizes = [int(size) for size in options.sizes.split(",")]
+
+    mismatches = 0
+    count = 0
+    as_time = 0.0
+    encode_time = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        object_file = os.path.join(tmp, "as.o")
+        for name, source in corpus(sizes):
+            for optimize in (False, True):
+                result = compiler.compile_source(source, optimize=optimize)
+                start = time.perf_counter()
+                assembled = subprocess.run(["as", "-o", object_file, "-"], input=result.assembly, text=True, capture_output=True)
+                as_time += time.perf_counter() - start
+                expected = None
+                if assembled.returncode == 0:
+                    with open(object_file, "rb") as f:
+                        expected = encoder.text_section(f.read())
+
+                # programs as rejects (e.g. oversized immediates) must be
+                # rejected by the encoder too
+                start = time.perf_counter()
+                try:
+                    actual = encoder.text_section(encoder.object_bytes(result.assembly_program))
+                except ValueError:
+                    actual = None
+                encode_time += time.perf_counter() - start
+
+                count += 1
+                if actual != expected:
+                    mismatches += 1
+                    print(f"MISMATCH {name}{' -O' if optimize else ''}")
+
+    print(f"{count} programs, {mismatches} mismatches")
+    if count:
+        print(f"as:      {as_time / count * 1000:8.2f} ms/program")
+        print(f"encoder: {encode_time / count * 1000:8.2f} ms/program")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
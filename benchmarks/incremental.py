@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Incremental recompilation benchmark.
+
+Compiles a file of many functions (benchmarks/programs.py many_functions,
+with chains of up to CHAIN operators) with a per-function cache, changes
+one function, and compiles it again.
+Prints the time of a full compile, the cold cached compile and the
+recompile after the edit, and checks that the incremental output matches
+a full compile of the edited file.
+
+Each cached function costs a file read, so functions that are only a few
+instructions long are about as cheap to recompile as to load.
+
+usage: python3 benchmarks/incremental.py [FUNCTIONS] [CHAIN]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cache
+import compiler
+
+import programs
+
+DEFAULT_FUNCTIONS = 200
+DEFAULT_CHAIN = 400
+
+def timed_compile(source: str, function_cache=None):
+    context = compiler.CompilationContext(function_cache=function_cache)
+    start = time.perf_counter()
+    result = compiler.compile_source(source, context=context)
+    return result.assembly, time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FUNCTIONS
+    chain = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CHAIN
+    source = programs.many_functions(count, chain)
+    # a one-line edit in the middle of the file
+    edited = source.replace("int f7(void) {\n    return ", "int f7(void) {\n    return ~ ", 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        function_cache = cache.CompileCache(tmp)
+        _, full = timed_compile(source)
+        _, cold = timed_compile(source, function_cache)
+        incremental, warm = timed_compile(edited, function_cache)
+
+    expected, _ = timed_compile(edited)
+    print(f"{count} functions")
+    print(f"full compile:          {full * 1000:10.1f} ms")
+    print(f"cold, filling cache:   {cold * 1000:10.1f} ms")
+    print(f"after a one-line edit: {warm * 1000:10.1f} ms")
+    if incremental != expected:
+        print("MISMATCH: incremental output differs from a full compile")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
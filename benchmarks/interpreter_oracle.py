@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Differential check of the optimizer and backend against the interpreter.
+
+Generates random expressions, interprets the unoptimized TACKY as the
+reference, and compares it with the optimized TACKY, the dense encoding
+and the generated code run in memory with and without -O. The first few
+programs are also built with gcc, so that the reference itself is checked.
+Prints any disagreement and the batch throughput of the interpreter.
+
+Exits with status 1 if anything disagrees.
+
+usage: python3 benchmarks/interpreter_oracle.py [PROGRAMS] [SEED]
+"""
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import compiler
+import interpreter
+import jit
+import tacky
+
+DEFAULT_PROGRAMS = 1000
+
+# programs checked against gcc as well
+GCC_PROGRAMS = 20
+
+CONSTANTS = ["0", "1", "7", "8", "010", "0777", "255", "2147483647", "2147483648", "037777777777", "4294967295"]
+
+def random_expression(rng: random.Random, depth: int = 0):
+    choice = rng.random()
+    if depth > 12 or choice < 0.1:
+        return rng.choice(CONSTANTS)
+    if choice < 0.7:
+        # "- -" rather than "--", which lexes as a decrement
+        return rng.choice(["- ", "~"]) + random_expression(rng, depth + 1)
+    return "(" + random_expression(rng, depth + 1) + ")"
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PROGRAMS
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    sources = [f"int main(void) {{\n    return {random_expression(rng)};\n}}\n" for _ in range(count)]
+
+    start = time.perf_counter()
+    expected = list(interpreter.evaluate_batch(sources))
+    elapsed = time.perf_counter() - start
+
+    mismatches = 0
+    for source, value in zip(sources, expected):
+        plain = compiler.compile_source(source)
+        optimized = compiler.compile_source(source, optimize=True)
+        results = {
+            "tacky -O": interpreter.interpret(optimized.tacky_program),
+            "dense": interpreter.interpret(tacky.to_dense(plain.tacky_program)),
+            "run": jit.run_program(plain.assembly_program),
+            "run -O": jit.run_program(optimized.assembly_program),
+        }
+        for name, actual in results.items():
+            if actual != value:
+                mismatches += 1
+                print(f"MISMATCH {name}: {actual} != {value}\n{source}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_file = os.path.join(directory, "oracle.c")
+        executable = os.path.join(directory, "oracle")
+        for source, value in zip(sources[:GCC_PROGRAMS], expected):
+            with open(source_file, "w") as f:
+                f.write(source)
+            subprocess.run(["gcc", "-w", source_file, "-o", executable], check=True)
+            actual = subprocess.run([executable]).returncode
+            if actual != value & 0xFF:
+                mismatches += 1
+                print(f"MISMATCH gcc: {actual} != {value & 0xFF}\n{source}")
+
+    print(f"{count} programs, {mismatches} mismatches")
+    print(f"interpreter batch: {elapsed / count * 1e6:8.1f} us/program (lex to result)")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
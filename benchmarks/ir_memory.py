@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+IR memory benchmark.
+
+Runs a long unary chain through lexer, parser, tacky and generator and
+reports, for each stage, the tracemalloc peak and the number of memory
+blocks still held by its result.
+
+usage: python3 benchmarks/ir_memory.py [DEPTH]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import lexer
+import parser
+import tacky
+import generator
+
+DEFAULT_DEPTH = 200000
+
+def measure(name, fn, *args):
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = fn(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+
+    print(f"{name:>10} {current / 2**20:>12.2f} {peak / 2**20:>12.2f} {blocks:>12}")
+    return result
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DEPTH
+    source = "int main(void) { return " + "-~" * (depth // 2) + "(1); }\n"
+
+    print(f"{'stage':>10} {'kept (MB)':>12} {'peak (MB)':>12} {'blocks':>12}")
+    tokens = measure("lex", lexer.tokenize, source)
+    program = measure("parse", parser.parse_program, tokens)
+    tacky_program = measure("tacky", tacky.tacky_translate, program)
+    measure("codegen", generator.translate, tacky_program)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Size and load time of the serialized IR of each stage.
+
+Compiles a file of many functions (benchmarks/programs.py many_functions),
+writes the IR of every stage with the serializer, and reports each file's
+size next to the source's and the time to load it next to the time to
+recompute it: lexing for tokens, lexing and parsing for the AST, and so on.
+Every loaded IR is compiled on and checked against the original assembly.
+
+usage: python3 benchmarks/ir_serialization.py [--functions 20000] [--repeat 3]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import compiler
+import serializer
+
+import programs
+
+# (name, stage, CompileResult field)
+STAGES = [
+    ("tokens", "lex", "tokens"),
+    ("ast", "parse", "program"),
+    ("tacky", "tacky", "tacky_program"),
+    ("assembly", "codegen", "assembly_program"),
+]
+
+def best_time(repeat: int, fn, *args):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--functions", type=int, default=20000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    options = arg_parser.parse_args()
+
+    source = programs.many_functions(options.functions)
+    full = compiler.compile_source(source)
+    print(f"{options.functions} functions, source {len(source) / 1024:.1f} KB")
+    print(f"{'stage':<10} {'IR KB':>10} {'load ms':>10} {'recompute ms':>14} {'speedup':>8}")
+
+    failed = False
+    for name, stage, field in STAGES:
+        data = serializer.dump(getattr(full, field))
+        load = best_time(options.repeat, serializer.load, data)
+        recompute = best_time(options.repeat, compiler.compile_source, source, stage)
+        _, ir = serializer.load(data)
+        if compiler.compile_ir(ir, stage).assembly != full.assembly:
+            failed = True
+            print(f"MISMATCH after resuming from {name}")
+        print(f"{name:<10} {len(data) / 1024:>10.1f} {load * 1000:>10.1f} {recompute * 1000:>14.1f} {recompute / load:>7.1f}x")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Lexer memory benchmark.
+
+Writes a synthetic source file of the given size and compares the
+tracemalloc peak of reading + lexer.tokenize against lexer.tokenize_file,
+which maps the file and stores tokens as array spans.
+
+usage: python3 benchmarks/lexer_memory.py [SIZE]    (e.g. 10M, default 4M)
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import lexer
+
+from lexer_scaling import make_input, parse_size
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(tokens), peak, elapsed
+
+def read_and_tokenize(path):
+    with open(path, "r") as f:
+        return lexer.tokenize(f.read())
+
+def main():
+    size = parse_size(sys.argv[1]) if len(sys.argv) > 1 else parse_size("4M")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".i", delete=False) as f:
+        f.write(make_input(size))
+        path = f.name
+
+    try:
+        print(f"{'lexer':<16} {'tokens':>10} {'peak MB':>10} {'seconds':>10}")
+        for name, fn in [
+            ("tokenize", lambda: read_and_tokenize(path)),
+            ("tokenize_file", lambda: lexer.tokenize_file(path)),
+        ]:
+            count, peak, elapsed = measure(fn)
+            print(f"{name:<16} {count:>10} {peak / 2**20:>10.2f} {elapsed:>10.3f}")
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
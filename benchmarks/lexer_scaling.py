@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Lexer scaling benchmark.
+
+Tokenizes synthetic inputs of increasing size and prints the time per byte
+for each one. A linear-time lexer keeps the ns/byte column roughly flat.
+
+usage: python3 benchmarks/lexer_scaling.py [SIZE ...]
+
+Sizes accept K/M suffixes (e.g. 1K 10M 100M). The 100M run needs several
+GB of memory for the token list, so it is not part of the defaults.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import lexer
+
+DEFAULT_SIZES = ["1K", "10K", "100K", "1M", "10M"]
+
+CHUNK = "int main(void) {\n    return -~(--2147483647);\n}\n"
+
+def parse_size(text):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if text[-1].upper() in units:
+        return int(text[:-1]) * units[text[-1].upper()]
+    return int(text)
+
+def make_input(size):
+    repeats = size // len(CHUNK) + 1
+    return (CHUNK * repeats)[:size].rsplit("\n", 1)[0] + "\n"
+
+def main():
+    sizes = sys.argv[1:] or DEFAULT_SIZES
+
+    print(f"{'size':>8} {'bytes':>12} {'tokens':>12} {'seconds':>10} {'ns/byte':>10}")
+    for size in sizes:
+        program_input = make_input(parse_size(size))
+
+        start = time.perf_counter()
+        tokens = lexer.tokenize(program_input)
+        elapsed = time.perf_counter() - start
+
+        print(f"{size:>8} {len(program_input):>12} {len(tokens):>12} "
+              f"{elapsed:>10.4f} {elapsed * 1e9 / len(program_input):>10.1f}")
+
+        del tokens, program_input
+
+if __name__ == "__main__":
+    main()
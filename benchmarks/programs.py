@@ -0,0 +1,51 @@
+"""
+Synthetic C programs for the supported grammar, at controlled sizes.
+
+Every generator takes a size n and returns the source of a valid program
+whose interesting feature grows linearly with n.
+"""
+
+import random
+
+def unary_chain(n: int):
+    # n alternating unary operators in front of a constant
+    ops = "".join("-" if i % 2 == 0 else "~" for i in range(n))
+    # keep '-' '-' apart, since "--" lexes as a single token
+    return f"int main(void) {{\n    return {' '.join(ops)} 1;\n}}\n"
+
+def paren_nesting(n: int):
+    return f"int main(void) {{\n    return {'(' * n}42{')' * n};\n}}\n"
+
+def mixed_nesting(n: int):
+    # n levels of unary operators applied to parenthesized subexpressions
+    return f"int main(void) {{\n    return {'-(~(' * (n // 2)}7{'))' * (n // 2)};\n}}\n"
+
+def long_identifier(n: int):
+    rng = random.Random(n)
+    letters = "abcdefghijklmnopqrstuvwxyz_"
+    name = "f" + "".join(rng.choice(letters) for _ in range(n - 1))
+    return f"int {name}(void) {{\n    return 0;\n}}\n"
+
+def large_constant(n: int):
+    # an n-digit constant under a short chain of operators
+    rng = random.Random(n)
+    digits = "".join(rng.choice("0123456789") for _ in range(n))
+    return f"int main(void) {{\n    return -~{'1' + digits[1:]};\n}}\n"
+
+def many_functions(n: int, chain: int = 8):
+    # n small functions, each with a chain of fewer than chain operators
+    functions = []
+    for i in range(n - 1):
+        ops = "".join(("-" if j % 2 == 0 else "~") + " " for j in range(i % chain))
+        functions.append(f"int f{i}(void) {{\n    return {ops}{i};\n}}\n")
+    functions.append("int main(void) {\n    return 0;\n}\n")
+    return "".join(functions)
+
+GENERATORS = {
+    "unary_chain": unary_chain,
+    "paren_nesting": paren_nesting,
+    "mixed_nesting": mixed_nesting,
+    "long_identifier": long_identifier,
+    "large_constant": large_constant,
+    "many_functions": many_functions,
+}
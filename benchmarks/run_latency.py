@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Per-test latency of running a compiled program.
+
+Compiles a set of small programs once, then measures the mean time to get
+main's exit status either by assembling and linking with gcc and running
+the executable, or by calling the code in memory with jit.run_program.
+Both routes must agree on every exit status.
+
+usage: python3 benchmarks/run_latency.py [PROGRAMS]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import compiler
+import jit
+
+DEFAULT_PROGRAMS = 50
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PROGRAMS
+    results = [
+        compiler.compile_source(f"int main(void) {{\n    return {'-~' * (i % 7)}{i};\n}}\n", optimize=i % 2 == 1)
+        for i in range(count)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        executable = os.path.join(tmp, "prog")
+        start = time.perf_counter()
+        expected = []
+        for result in results:
+            subprocess.run(["gcc", "-x", "assembler", "-", "-o", executable], input=result.assembly, text=True, check=True)
+            expected.append(subprocess.run([executable]).returncode)
+        gcc_time = (time.perf_counter() - start) / count
+
+    start = time.perf_counter()
+    actual = [jit.exit_status(jit.run_program(result.assembly_program)) for result in results]
+    jit_time = (time.perf_counter() - start) / count
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"{count} programs, {mismatches} mismatches")
+    print(f"gcc + exec: {gcc_time * 1e6:10.1f} us/program")
+    print(f"in memory:  {jit_time * 1e6:10.1f} us/program")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compile server latency benchmark.
+
+Compiles the same set of small files to assembly (-S) twice: once with a
+fresh `python3 driver.py` per file, and once with `python3 client.py`
+talking to a running server.py. Prints the mean per-file latency of each.
+
+usage: python3 benchmarks/server_latency.py [FILES]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+DEFAULT_FILES = 50
+
+def time_per_file(cmd_for, paths):
+    start = time.perf_counter()
+    for path in paths:
+        subprocess.run(cmd_for(path), check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / len(paths)
+
+def wait_for(path, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise Exception("Server did not start!")
+        time.sleep(0.01)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FILES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(count):
+            path = os.path.join(tmp, f"prog{i}.c")
+            with open(path, "w") as f:
+                f.write(f"int main(void) {{\n    return {'-~' * (i % 7)}{i};\n}}\n")
+            paths.append(path)
+
+        cold = time_per_file(
+            lambda path: [sys.executable, os.path.join(ROOT, "driver.py"), "-S", path],
+            paths
+        )
+
+        socket_path = os.path.join(tmp, "server.sock")
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--socket", socket_path])
+        try:
+            wait_for(socket_path)
+            # python's own -S (skip site) keeps the client's startup minimal
+            warm = time_per_file(
+                lambda path: [sys.executable, "-S", os.path.join(ROOT, "client.py"), "--socket", socket_path, "-S", path],
+                paths
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"files:           {count}")
+    print(f"cold driver.py:  {cold * 1000:8.2f} ms/file")
+    print(f"server + client: {warm * 1000:8.2f} ms/file")
+    print(f"speedup:         {cold / warm:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Per-stage benchmark suite.
+
+For every synthetic program shape in benchmarks/programs.py and every
+size, times tokenize, parse_program, tacky_translate, translate and
+generate_assembly separately (best of --repeat runs). The scaling
+exponent of each stage is fitted as the slope of log(time) against
+log(size); stages whose exponent exceeds --max-exponent are flagged as
+super-linear.
+
+--fused times generator.translate's fused single-pass lowering in place
+of the three-pass one; saving a baseline without it and comparing with it
+benchmarks the two side by side.
+
+--save FILE writes the results as a baseline. --baseline FILE compares
+against one and exits with status 1 if any stage got slower by more than
+--threshold (a fraction, 0.25 = 25%), or if a stage is super-linear.
+
+usage: python3 benchmarks/stages.py [--shapes a,b] [--sizes 1000,10000]
+                                    [--fused] [--save FILE] [--baseline FILE]
+"""
+
+import argparse
+import functools
+import gc
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import lexer
+import parser
+import tacky
+import generator
+import emitter
+
+import programs
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+STAGES = [
+    ("tokenize", lexer.tokenize),
+    ("parse_program", parser.parse_program),
+    ("tacky_translate", tacky.tacky_translate),
+    ("translate", generator.translate),
+    ("generate_assembly", emitter.generate_assembly),
+]
+
+def time_stages(source: str, repeat: int):
+    timings = {}
+    value = source
+    for name, fn in STAGES:
+        best = None
+        for _ in range(repeat):
+            # keep collector pauses out of the measurement
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                result = fn(value)
+                elapsed = time.perf_counter() - start
+            finally:
+                gc.enable()
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+        value = result
+    return timings
+
+def scaling_exponent(sizes: list, times: list):
+    # least-squares slope in log-log space: time ~ size ** exponent
+    points = [(math.log(s), math.log(t)) for s, t in zip(sizes, times) if t > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    den = sum((x - mean_x) ** 2 for x, _ in points)
+    return num / den if den else None
+
+def run(shapes: list, sizes: list, repeat: int):
+    results = {}
+    for shape in shapes:
+        make = programs.GENERATORS[shape]
+        per_size = {}
+        for size in sizes:
+            per_size[str(size)] = time_stages(make(size), repeat)
+        exponents = {
+            name: scaling_exponent(sizes, [per_size[str(size)][name] for size in sizes])
+            for name, _ in STAGES
+        }
+        results[shape] = {"times": per_size, "exponents": exponents}
+    return results
+
+def report(results: dict, max_exponent: float):
+    flagged = []
+    for shape, result in results.items():
+        print(f"{shape}:")
+        print(f"  {'stage':<18}" + "".join(f"{size:>12}" for size in result["times"]) + f"{'exponent':>10}")
+        for name, _ in STAGES:
+            row = "".join(f"{result['times'][size][name] * 1000:>10.2f}ms" for size in result["times"])
+            exponent = result["exponents"][name]
+            mark = ""
+            if exponent is not None and exponent > max_exponent:
+                mark = "  super-linear"
+                flagged.append((shape, name, exponent))
+            exponent_text = "-" if exponent is None else f"{exponent:.2f}"
+            print(f"  {name:<18}{row}{exponent_text:>10}{mark}")
+    return flagged
+
+def compare(results: dict, baseline: dict, threshold: float):
+    regressions = []
+    for shape, result in results.items():
+        for size, timings in result["times"].items():
+            old = baseline.get(shape, {}).get("times", {}).get(size)
+            if old is None:
+                continue
+            for name, elapsed in timings.items():
+                if name in old and old[name] > 0 and elapsed > old[name] * (1 + threshold):
+                    regressions.append((shape, size, name, old[name], elapsed))
+    return regressions
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Per-stage compiler benchmarks.")
+    arg_parser.add_argument("--shapes", default=",".join(programs.GENERATORS))
+    arg_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--max-exponent", type=float, default=1.2)
+    arg_parser.add_argument("--save", metavar="FILE")
+    arg_parser.add_argument("--baseline", metavar="FILE")
+    arg_parser.add_argument("--threshold", type=float, default=0.25)
+    arg_parser.add_argument("--fused", action="store_true")
+    args = arg_parser.parse_args()
+
+    if args.fused:
+        index = [name for name, _ in STAGES].index("translate")
+        STAGES[index] = ("translate", functools.partial(generator.translate, fused=True))
+
+    shapes = args.shapes.split(",")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = run(shapes, sizes, args.repeat)
+    flagged = report(results, args.max_exponent)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = bool(flagged)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for shape, size, name, old, new in regressions:
+            print(f"regression: {shape} size {size} {name}: {old * 1000:.2f}ms -> {new * 1000:.2f}ms")
+        failed = failed or bool(regressions)
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Peak memory of whole-program vs streaming compilation.
+
+Compiles files of growing numbers of functions (benchmarks/programs.py
+many_functions) once with compile_source, which keeps every IR of the file
+alive, and once with stream_source, which compiles and writes one function
+at a time. Output goes to a sink that discards it, and the source text is
+built before measuring, so the tracemalloc peak is the pipeline's own.
+
+usage: python3 benchmarks/stream_memory.py [--sizes 100,1000,10000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import compiler
+
+import programs
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+class NullStream:
+    def write(self, text: str):
+        return len(text)
+
+def peak_memory(fn, *args):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def compile_whole(source: str):
+    NullStream().write(compiler.compile_source(source).assembly)
+
+def compile_streaming(source: str):
+    compiler.stream_source(source, NullStream())
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    options = arg_parser.parse_args()
+
+    print(f"{'functions':>10} {'source KB':>10} {'whole KB':>10} {'stream KB':>10}")
+    for size in (int(size) for size in options.sizes.split(",")):
+        source = programs.many_functions(size)
+        whole = peak_memory(compile_whole, source)
+        streaming = peak_memory(compile_streaming, source)
+        print(f"{size:>10} {len(source) / 1024:>10.1f} {whole / 1024:>10.1f} {streaming / 1024:>10.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Content-addressed compile cache.
+
+Entries are keyed by a hash of the preprocessed source, the compiler
+version (a hash of the compiler's own source files) and the options that
+affect the result. An entry holds the emitted assembly, or nothing for
+stages that stop before emission (--lex, --parse, --tacky, --codegen),
+where a hit just means the stage is known to succeed.
+
+The same directory also holds one entry per function (see key_function),
+with that function's assembly, so that after an edit only the functions
+that changed are recompiled.
+
+Entries are written to a temporary file and renamed into place, so
+concurrent builds can share one directory. Hits refresh an entry's mtime
+and evict() removes the least recently used entries once the directory
+grows past its size limit.
+"""
+
+import hashlib
+import os
+import tempfile
+
+CACHE_DIR_ENV = "C_COMPILER_CACHE_DIR"
+CACHE_SIZE_ENV = "C_COMPILER_CACHE_SIZE"
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# every module whose source decides what assembly comes out, including
+# compiler, which picks the passes that run
+COMPILER_MODULES = ["compiler", "lexer", "parser", "tacky", "optimizer", "generator", "peephole", "emitter"]
+
+compiler_version_hash = None
+
+def compiler_version():
+    # any change to the compiler invalidates every entry
+    global compiler_version_hash
+    if compiler_version_hash is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in COMPILER_MODULES:
+            with open(os.path.join(directory, f"{module}.py"), "rb") as f:
+                digest.update(f.read())
+        compiler_version_hash = digest.hexdigest()
+    return compiler_version_hash
+
+class CompileCache:
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key_digest(
+        self,
+        option: str,
+        optimize: bool,
+        peephole: bool = None,
+        dense_tacky: bool = False,
+        fused_lowering: bool = False
+    ):
+        # -S and a full build both produce the same assembly
+        if option == "-S":
+            option = ""
+        # the other options are those of compiler.CompilationContext; the
+        # peephole pass runs under optimize unless set either way
+        peephole = optimize if peephole is None else peephole
+        flags = "".join(str(int(flag)) for flag in (optimize, peephole, dense_tacky, fused_lowering))
+        digest = hashlib.sha256()
+        digest.update(compiler_version().encode())
+        digest.update(f"\0{option}\0{flags}\0".encode())
+        return digest
+
+    def key(self, source: str, option: str, optimize: bool, **options):
+        digest = self.key_digest(option, optimize, **options)
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def key_function(self, token_digest: str, optimize: bool, **options):
+        # token_digest identifies the function's tokens; the option slot
+        # keeps these keys apart from whole-file ones
+        digest = self.key_digest("function", optimize, **options)
+        digest.update(token_digest.encode())
+        return digest.hexdigest()
+
+    def key_file(self, filename: str, option: str, optimize: bool, **options):
+        # same key as key() on the file's text, hashed in chunks
+        digest = self.key_digest(option, optimize, **options)
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key: str):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str):
+        path = self.path(key)
+        try:
+            with open(path, "r") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by a concurrent build in the meantime
+            pass
+        return text
+
+    def put(self, key: str, text: str):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def parse_size(text: str):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if text[-1].upper() in units:
+        return int(text[:-1]) * units[text[-1].upper()]
+    return int(text)
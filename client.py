@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Thin client for server.py with the same command line as driver.py.
+
+usage: python3 client.py [--socket PATH] [--lex | --parse | --tacky | --codegen | -S] [-O] file.c
+
+The socket defaults to $C_COMPILER_SOCKET. Only the standard library is
+imported here, so startup stays cheap; the server does the compiling and
+this process writes the .s file and runs gcc for assembling and linking.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+
+OPTIONS = {"--lex", "--parse", "--tacky", "--codegen", "-S"}
+
+def request(socket_path, payload: dict):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(payload) + "\n").encode())
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("r") as f:
+            return json.loads(f.readline())
+
+def main(argv):
+    socket_path = os.environ.get("C_COMPILER_SOCKET", "")
+    input_file = ""
+    option = ""
+    optimize = False
+
+    args = iter(argv)
+    for arg in args:
+        if arg == "--socket":
+            socket_path = next(args, "")
+        elif arg in OPTIONS:
+            option = arg
+        elif arg == "-O":
+            optimize = True
+        else:
+            input_file = arg
+
+    if not socket_path:
+        print("Error: no server socket given (--socket or C_COMPILER_SOCKET).", file=sys.stderr)
+        return 1
+
+    response = request(socket_path, {
+        "path": os.path.abspath(input_file),
+        "stage": option,
+        "optimize": optimize,
+    })
+    if not response["ok"]:
+        print(f"Error: {response['error']}", file=sys.stderr)
+        return 1
+
+    if response["assembly"] is None:
+        return 0
+
+    base_name, _ = os.path.splitext(input_file)
+    assembly_file = f"{base_name}.s"
+    output_file = base_name
+
+    with open(assembly_file, "w") as f:
+        f.write(response["assembly"])
+
+    if option == "-S":
+        return 0
+
+    assemble_cmd = ["gcc", assembly_file, "-o", output_file]
+    returncode = subprocess.run(assemble_cmd).returncode
+    os.remove(assembly_file)
+    if returncode != 0:
+        print("Error: Assembly and linking failed.", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
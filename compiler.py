@@ -0,0 +1,371 @@
+"""
+In-process compiler API.
+
+result = compile_source("int main(void) { return ~-8; }", optimize=True)
+print(result.assembly)
+
+compile_source runs the pipeline up to stop_at (one of STAGES) and returns
+a CompileResult holding every IR built on the way. All mutable state lives
+in the CompilationContext created for the call (temporary numbering,
+options, diagnostics, stats), so any number of compilations can run
+concurrently in one process. Failures raise CompileError, which records
+the stage that failed.
+
+With a function cache in the context (a cache.CompileCache), compiling to
+"assembly" is incremental: every function is keyed by a hash of its tokens,
+and only functions whose tokens changed go through TACKY, code generation
+and emission; the others reuse their cached text. Only result.assembly is
+complete then, since tacky_program and assembly_program hold just the
+recompiled functions.
+
+compile_ir resumes from the IR of any stage, e.g. one written by the
+serializer module.
+
+stream_source and stream_file run the whole pipeline one function at a
+time instead, writing each function's assembly to a stream before the next
+one is parsed, so memory use is bounded by the largest function rather
+than by the file.
+
+"""
+
+import hashlib
+import mmap
+
+from contextlib import contextmanager
+
+import lexer
+import parser
+import tacky
+import optimizer
+import generator
+import peephole
+import emitter
+import stats
+
+STAGES = ["lex", "parse", "tacky", "codegen", "assembly"]
+
+class CompileError(Exception):
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+        self.message = message
+
+class CompilationContext:
+    __slots__ = (
+        "optimize", "trace", "peephole", "dense_tacky", "fused_lowering", "function_cache",
+        "temporaries", "diagnostics", "peephole_hits", "recorder"
+    )
+
+    def __init__(
+        self,
+        optimize: bool = False,
+        trace: bool = False,
+        recorder=None,
+        dense_tacky: bool = False,
+        fused_lowering: bool = False,
+        function_cache=None,
+        peephole: bool = None
+    ):
+        self.optimize = optimize
+        self.trace = trace
+        # the peephole pass runs under optimize unless set either way; on
+        # its own it sees the stack-slot code register allocation removes
+        self.peephole = optimize if peephole is None else peephole
+        # hand TACKY to the generator in the tacky.DenseTackyProgram encoding
+        self.dense_tacky = dense_tacky
+        # single-pass lowering in generator.translate (same output)
+        self.fused_lowering = fused_lowering
+        # per-function assembly cache, see the module docstring
+        self.function_cache = function_cache
+        self.temporaries = tacky.TemporaryCounter()
+        # parser trace output and other messages for the caller
+        self.diagnostics = []
+        self.peephole_hits = {}
+        self.recorder = recorder or stats.NULL_RECORDER
+
+class CompileResult:
+    __slots__ = ("tokens", "program", "tacky_program", "assembly_program", "assembly", "diagnostics", "peephole_hits")
+
+    def __init__(self, context: CompilationContext):
+        self.tokens = None
+        self.program = None
+        self.tacky_program = None
+        self.assembly_program = None
+        self.assembly = None
+        self.diagnostics = context.diagnostics
+        self.peephole_hits = context.peephole_hits
+
+@contextmanager
+def stage_errors(stage: str):
+    try:
+        yield
+    except CompileError:
+        raise
+    except Exception as e:
+        raise CompileError(stage, str(e)) from e
+
+def make_context(optimize: bool, trace: bool, context: CompilationContext):
+    if context is None:
+        context = CompilationContext(optimize=optimize, trace=trace)
+    return context
+
+def check_stage(stop_at: str):
+    if stop_at not in STAGES:
+        raise ValueError(f"Unknown stage {stop_at!r}, expected one of {STAGES}")
+
+def compile_source(source: str, stop_at: str = "assembly", optimize: bool = False, trace: bool = False, context: CompilationContext = None):
+    check_stage(stop_at)
+    context = make_context(optimize, trace, context)
+    result = CompileResult(context)
+
+    # Lexing
+    with stage_errors("lex"), context.recorder.phase("lex") as sizes:
+        result.tokens = lexer.tokenize(source)
+        sizes["tokens"] = len(result.tokens)
+
+    return compile_tokens(result, stop_at, context)
+
+def compile_file(filename: str, stop_at: str = "assembly", optimize: bool = False, trace: bool = False, context: CompilationContext = None):
+    """
+    Like compile_source, but the preprocessed file is memory-mapped and
+    lexed in place into a lexer.TokenStore. With stop_at="lex" the store is
+    returned open and the caller closes it; otherwise it is closed once the
+    later stages are done with it, and result.tokens is None.
+    """
+    check_stage(stop_at)
+    context = make_context(optimize, trace, context)
+    result = CompileResult(context)
+
+    # Lexing
+    with stage_errors("lex"), context.recorder.phase("lex") as sizes:
+        result.tokens = lexer.tokenize_file(filename)
+        sizes["tokens"] = len(result.tokens)
+
+    if stop_at == "lex":
+        return result
+    try:
+        return compile_tokens(result, stop_at, context)
+    finally:
+        # the AST holds decoded strings, not views of the mapping
+        result.tokens.close()
+        result.tokens = None
+
+def lexed(tokens):
+    # lexing happens lazily inside the parser; this keeps its errors
+    # attributed to the lex stage
+    with stage_errors("lex"):
+        yield from tokens
+
+def compile_function(function_definition: parser.FunctionDefinition, stream, context: CompilationContext):
+    with stage_errors("tacky"):
+        tacky_function = tacky.tacky_translate_function(function_definition, context.temporaries)
+        if context.optimize:
+            tacky_function = optimizer.optimize_function(tacky_function)
+
+    with stage_errors("codegen"):
+        if context.dense_tacky:
+            tacky_function = tacky.to_dense_function(tacky_function)
+        assembly_function = generator.translate_function(
+            tacky_function,
+            register_allocation=context.optimize,
+            fused=context.fused_lowering
+        )
+        if context.peephole:
+            assembly_function = peephole.optimize_function(assembly_function, hits=context.peephole_hits)
+
+    with stage_errors("assembly"):
+        emitter.emit_function(assembly_function, stream)
+
+def stream_tokens(tokens, stream, context: CompilationContext):
+    # each function's IRs are dropped when the next one is parsed
+    token_stream = parser.LazyTokenStream(lexed(tokens), trace=context.trace, log=context.diagnostics.append)
+    functions = parser.iter_functions(token_stream)
+    with context.recorder.phase("stream") as sizes:
+        count = 0
+        while True:
+            with stage_errors("parse"):
+                function_definition = next(functions, None)
+            if function_definition is None:
+                break
+            compile_function(function_definition, stream, context)
+            count += 1
+        with stage_errors("assembly"):
+            stream.write(emitter.GNU_STACK_NOTE)
+        sizes["tokens"] = token_stream.pos
+        sizes["functions"] = count
+    return count
+
+def stream_source(source: str, stream, optimize: bool = False, trace: bool = False, context: CompilationContext = None):
+    """
+    Compiles source to assembly written to stream, one function at a time,
+    and returns the number of functions. On a CompileError the functions
+    before the failing one have already been written.
+    """
+    context = make_context(optimize, trace, context)
+    return stream_tokens(lexer.iter_tokens(source), stream, context)
+
+def stream_file(filename: str, stream, optimize: bool = False, trace: bool = False, context: CompilationContext = None):
+    # like stream_source, lexing the memory-mapped file in place
+    context = make_context(optimize, trace, context)
+    buffer = lexer.map_file(filename)
+    try:
+        return stream_tokens(lexer.iter_tokens(buffer), stream, context)
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+
+def instruction_count(function_definitions):
+    return sum(len(f.instructions) for f in function_definitions)
+
+def function_key(tokens, function_definition: parser.FunctionDefinition, context: CompilationContext):
+    # a function compiles the same wherever it appears, so its tokens (and
+    # the options that change the output) are all the key depends on
+    start, end = function_definition.token_span
+    text = "\0".join(tokens[index].string for index in range(start, end))
+    digest = hashlib.sha256(text.encode()).hexdigest()
+    return context.function_cache.key_function(
+        digest,
+        context.optimize,
+        peephole=context.peephole,
+        dense_tacky=context.dense_tacky,
+        fused_lowering=context.fused_lowering
+    )
+
+def lookup_functions(result: CompileResult, context: CompilationContext):
+    # returns (key, cached text or None) for every function, in order
+    function_cache = context.function_cache
+    entries = []
+    for function_definition in result.program.function_definitions:
+        key = function_key(result.tokens, function_definition, context)
+        entries.append((key, function_cache.get(key)))
+    return entries
+
+def assemble_functions(entries: list, assembly_program, context: CompilationContext):
+    # emits and caches the recompiled functions, filling the gaps between
+    # the cached ones in source order
+    compiled = iter(assembly_program.function_definitions)
+    texts = []
+    for key, text in entries:
+        if text is None:
+            text = emitter.generate_function(next(compiled))
+            context.function_cache.put(key, text)
+        texts.append(text)
+    texts.append(emitter.GNU_STACK_NOTE)
+    return "".join(texts)
+
+def compile_tokens(result: CompileResult, stop_at: str, context: CompilationContext):
+    recorder = context.recorder
+
+    if stop_at == "lex":
+        return result
+
+    # Parsing
+    with stage_errors("parse"), recorder.phase("parse") as sizes:
+        result.program = parser.parse_program(result.tokens, trace=context.trace, log=context.diagnostics.append)
+        if recorder is not stats.NULL_RECORDER:
+            sizes["ast_nodes"] = stats.count_ast_nodes(result.program)
+
+    if stop_at == "parse":
+        return result
+
+    return compile_program(result, stop_at, context)
+
+def compile_program(result: CompileResult, stop_at: str, context: CompilationContext):
+    # the rest of the pipeline, from result.program
+    recorder = context.recorder
+
+    # Function cache: only functions without a cached entry are compiled
+    program = result.program
+    entries = None
+    # (keys hash the tokens, which a program resumed from an AST lacks)
+    if context.function_cache is not None and stop_at == "assembly" and result.tokens is not None:
+        with stage_errors("parse"), recorder.phase("function_cache") as sizes:
+            entries = lookup_functions(result, context)
+            misses = [f for f, (_, text) in zip(program.function_definitions, entries) if text is None]
+            sizes["functions"] = len(entries)
+            sizes["function_hits"] = len(entries) - len(misses)
+            program = parser.Program(misses)
+
+    # Tacky
+    with stage_errors("tacky"):
+        with recorder.phase("tacky") as sizes:
+            result.tacky_program = tacky.tacky_translate(program, context.temporaries)
+            sizes["tacky_instructions"] = instruction_count(result.tacky_program.function_definitions)
+        if context.optimize:
+            with recorder.phase("optimize") as sizes:
+                result.tacky_program = optimizer.optimize(result.tacky_program)
+                sizes["tacky_instructions"] = instruction_count(result.tacky_program.function_definitions)
+
+    if stop_at == "tacky":
+        return result
+
+    return compile_tacky(result, stop_at, context, entries)
+
+def compile_tacky(result: CompileResult, stop_at: str, context: CompilationContext, entries: list = None):
+    # the rest of the pipeline, from result.tacky_program
+    recorder = context.recorder
+
+    # Generation
+    with stage_errors("codegen"):
+        tacky_program = result.tacky_program
+        if context.dense_tacky:
+            with recorder.phase("dense") as sizes:
+                tacky_program = tacky.to_dense(tacky_program)
+                sizes["tacky_instructions"] = sum(len(dense) for dense in tacky_program)
+        with recorder.phase("codegen") as sizes:
+            result.assembly_program = generator.translate(
+                tacky_program,
+                register_allocation=context.optimize,
+                fused=context.fused_lowering
+            )
+            sizes["assembly_instructions"] = instruction_count(result.assembly_program.function_definitions)
+            sizes["stack_frame_bytes"] = sum(f.stack_size for f in result.assembly_program.function_definitions)
+        if context.peephole:
+            with recorder.phase("peephole") as sizes:
+                result.assembly_program = peephole.optimize(result.assembly_program, hits=context.peephole_hits)
+                sizes["assembly_instructions"] = instruction_count(result.assembly_program.function_definitions)
+                sizes["stack_frame_bytes"] = sum(f.stack_size for f in result.assembly_program.function_definitions)
+
+    if stop_at == "codegen":
+        return result
+
+    return compile_assembly(result, context, entries)
+
+def compile_assembly(result: CompileResult, context: CompilationContext, entries: list = None):
+    recorder = context.recorder
+
+    # Emission
+    with stage_errors("assembly"), recorder.phase("emit") as sizes:
+        if entries is None:
+            result.assembly = emitter.generate_assembly(result.assembly_program)
+        else:
+            result.assembly = assemble_functions(entries, result.assembly_program, context)
+        sizes["assembly_bytes"] = len(result.assembly)
+
+    return result
+
+# entry point into the pipeline for the IR of each stage; the stage's own
+# work has already been done
+RESUME_POINTS = {
+    "lex": ("tokens", compile_tokens),
+    "parse": ("program", compile_program),
+    "tacky": ("tacky_program", compile_tacky),
+    "codegen": ("assembly_program", lambda result, stop_at, context: compile_assembly(result, context)),
+}
+
+def compile_ir(ir, stage: str, stop_at: str = "assembly", optimize: bool = False, trace: bool = False, context: CompilationContext = None):
+    """
+    Resumes the pipeline from ir, the result of stage (e.g. as loaded with
+    serializer.load), running it up to stop_at. -O only affects the stages
+    that are still to run.
+    """
+    check_stage(stop_at)
+    if STAGES.index(stop_at) < STAGES.index(stage):
+        raise ValueError(f"Cannot stop at {stop_at!r} when resuming after {stage!r}")
+    context = make_context(optimize, trace, context)
+    result = CompileResult(context)
+    field, resume = RESUME_POINTS[stage]
+    setattr(result, field, ir)
+    if stop_at == stage:
+        return result
+    return resume(result, stop_at, context)
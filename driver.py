@@ -2,108 +2,627 @@
 
 import os
 import sys
+import json
 import subprocess
+import threading
+from itertools import repeat
 
-import lexer
-import parser
-import tacky
-import generator
+# encoder, jit, serializer, cProfile/pstats and the process pool serve
+# opt-in flags and are imported where those are handled, so that every
+# other build does not pay for loading them (jit loads ctypes)
+import peephole
 import emitter
+import interpreter
+import compiler
+import cache
+import stats
 
-# Parse arguments
 OPTIONS = {"--lex", "--parse", "--tacky", "--codegen", "-S"}
 
-input_file = ""
-option = ""
+def parse_args(argv):
+    args = {
+        "input_files": [],
+        "option": "",
+        "trace": False,
+        "optimize": False,
+        "peephole": None,
+        "peephole_stats": False,
+        "jobs": os.cpu_count() or 1,
+        "output_file": None,
+        "cache_dir": os.environ.get(cache.CACHE_DIR_ENV) or None,
+        "cache_size": cache.parse_size(os.environ.get(cache.CACHE_SIZE_ENV) or str(cache.DEFAULT_MAX_SIZE)),
+        "cache_stats": False,
+        "save_temps": False,
+        "mmap_lexer": False,
+        "dense_tacky": False,
+        "fused_lowering": False,
+        "stream": False,
+        "integrated_as": False,
+        "run": False,
+        "interpret": False,
+        "emit_ir": None,
+        "ir_inputs": [],
+        "stats": False,
+        "stats_json": None,
+        "profile": None,
+    }
 
-for arg in sys.argv[1:]:
-    if arg in OPTIONS:
-        option = arg
+    argv = iter(argv)
+    for arg in argv:
+        if arg in OPTIONS:
+            args["option"] = arg
+        elif arg == "--trace":
+            args["trace"] = True
+        elif arg == "-O":
+            args["optimize"] = True
+        elif arg == "--peephole":
+            args["peephole"] = True
+        elif arg == "--peephole-stats":
+            args["peephole_stats"] = True
+        elif arg == "-j":
+            args["jobs"] = int(next(argv))
+        elif arg.startswith("-j"):
+            args["jobs"] = int(arg[2:])
+        elif arg == "-o":
+            args["output_file"] = next(argv)
+        elif arg == "--cache-dir":
+            args["cache_dir"] = next(argv)
+        elif arg.startswith("--cache-dir="):
+            args["cache_dir"] = arg.split("=", 1)[1]
+        elif arg.startswith("--cache-size="):
+            args["cache_size"] = cache.parse_size(arg.split("=", 1)[1])
+        elif arg == "--cache-stats":
+            args["cache_stats"] = True
+        elif arg == "--save-temps":
+            args["save_temps"] = True
+        elif arg == "--mmap-lexer":
+            args["mmap_lexer"] = True
+        elif arg == "--dense-tacky":
+            args["dense_tacky"] = True
+        elif arg == "--fused-lowering":
+            args["fused_lowering"] = True
+        elif arg == "--stream":
+            args["stream"] = True
+        elif arg == "--integrated-as":
+            args["integrated_as"] = True
+        elif arg == "--run":
+            args["run"] = True
+        elif arg == "--interpret":
+            args["interpret"] = True
+        elif arg.startswith("--emit-ir="):
+            args["emit_ir"] = arg.split("=", 1)[1]
+        elif arg.startswith("--from-ir="):
+            # an IR file written with --emit-ir, compiled from its stage on
+            ir_file = arg.split("=", 1)[1]
+            args["ir_inputs"].append(ir_file)
+            args["input_files"].append(ir_file)
+        elif arg == "--stats":
+            args["stats"] = True
+        elif arg.startswith("--stats-json="):
+            args["stats_json"] = arg.split("=", 1)[1]
+        elif arg == "--profile":
+            args["profile"] = "compile.prof"
+        elif arg.startswith("--profile="):
+            args["profile"] = arg.split("=", 1)[1]
+        else:
+            args["input_files"].append(arg)
+
+    return args
+
+def remove_file(filename):
+    if os.path.exists(filename):
+        os.remove(filename)
+
+# stage each driver option stops after; full builds and -S take the
+# AssemblyProgram and emit it themselves
+OPTION_STAGES = {
+    "--lex": "lex",
+    "--parse": "parse",
+    "--tacky": "tacky",
+    "--codegen": "codegen",
+    "-S": "codegen",
+    "": "codegen",
+}
+
+STAGE_MESSAGES = [
+    ("lex", "Lexing completed (stub)"),
+    ("parse", "Parsing completed (stub)"),
+    ("tacky", "Tacky completed (stub)"),
+    ("codegen", "Code generation completed (stub)"),
+]
+
+def stage_messages(last_stage):
+    messages = []
+    for stage, message in STAGE_MESSAGES:
+        messages.append(message)
+        if stage == last_stage:
+            break
+    return messages
+
+def run_with_input(cmd, write_input):
+    """
+    Runs cmd, calling write_input(stream) to feed its stdin.
+
+    Returns (exit code, stderr text). stderr is drained on a separate thread
+    so a chatty process cannot block while its stdin is still being fed.
+    """
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stderr_chunks = []
+    reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()))
+    reader.start()
+    try:
+        write_input(proc.stdin)
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    reader.join()
+    return proc.wait(), "".join(stderr_chunks)
+
+class BuildResult:
+    __slots__ = ("returncode", "out", "err", "cache_hit", "phases", "exit_status")
+
+    def __init__(self, returncode: int, out: list, err: list, cache_hit=None):
+        self.returncode = returncode
+        self.out = out
+        self.err = err
+        # None when no cache is configured
+        self.cache_hit = cache_hit
+        # per-phase stats, filled in with --stats / --stats-json
+        self.phases = None
+        # the program's exit status with --run / --interpret
+        self.exit_status = None
+
+def build_file(input_file, args, link=True):
+    """
+    Preprocesses, compiles and assembles one file. With link, the result is
+    an executable named after the file, otherwise an object file.
+
+    The preprocessed source and the assembly are handed between gcc and the
+    compiler through pipes; the .i and .s files are only written for -S or
+    --save-temps.
+
+    Output is collected in the returned BuildResult instead of printed, so
+    that output from parallel builds can be shown in a deterministic order.
+    """
+    if not (args["stats"] or args["stats_json"]):
+        return run_build(input_file, args, link, stats.NULL_RECORDER)
+
+    recorder = stats.StatsRecorder()
+    result = run_build(input_file, args, link, recorder)
+    result.phases = recorder.to_list()
+    return result
+
+def run_build(input_file, args, link, recorder):
+    out = []
+    err = []
+    option = args["option"]
+    save_temps = args["save_temps"]
+
+    base_name, _ = os.path.splitext(input_file)
+    preprocessed_file = f"{base_name}.i"
+    assembly_file = f"{base_name}.s"
+    output_file = base_name if link else f"{base_name}.o"
+
+    # an IR file takes the place of preprocessing and of the stages up to
+    # the one it was written after
+    from_ir = input_file in args["ir_inputs"]
+    emit_ir = args["emit_ir"]
+    if from_ir or emit_ir is not None:
+        import serializer
+    if from_ir:
+        try:
+            with recorder.phase("load_ir") as sizes:
+                kind, ir = serializer.load_file(input_file)
+                sizes["ir_bytes"] = os.path.getsize(input_file)
+        except Exception as e:
+            err.append(f"Error: {e}")
+            return BuildResult(1, out, err)
+
+    # Preprocessing; the mmap lexer needs the output in a file, otherwise it
+    # is read straight from the pipe
+    mmap_lexer = args["mmap_lexer"] and not from_ir
+    source = None
+    if not from_ir:
+        preprocess_cmd = ["gcc", "-E", "-P", input_file]
+        if mmap_lexer:
+            preprocess_cmd += ["-o", preprocessed_file]
+        with recorder.phase("preprocess") as sizes:
+            result = subprocess.run(preprocess_cmd, capture_output=True, text=True)
+            if result.returncode == 0:
+                sizes["source_bytes"] = os.path.getsize(preprocessed_file) if mmap_lexer else len(result.stdout)
+        if result.returncode != 0:
+            err.append(result.stderr.rstrip("\n"))
+            err.append("Error: Preprocessing failed.")
+            return BuildResult(1, out, err)
+        if not mmap_lexer:
+            source = result.stdout
+
+    # the cache, --run, --interpret, --integrated-as and IR files all need
+    # the whole program at once, so they do not stream
+    whole_program = (
+        args["cache_dir"] is not None or args["run"] or args["interpret"] or args["integrated_as"]
+        or from_ir or emit_ir is not None
+    )
+    if args["stream"] and option in ("", "-S") and not whole_program:
+        return stream_build(source, preprocessed_file, assembly_file, output_file, args, link, recorder)
+
+    compile_cache = None
+    cache_hit = None
+    assembly_text = None
+    assembly_program = None
+    tacky_program = None
+
+    peephole_hits = None
+    try:
+        if save_temps and source is not None:
+            with open(preprocessed_file, "w") as f:
+                f.write(source)
+
+        # --run and --interpret create no files, so they bypass the cache;
+        # so do IR files, since a hit has only the assembly text and the
+        # cache keys hash the source
+        evaluate = option == "" and (args["run"] or args["interpret"])
+        if args["cache_dir"] is not None and not (evaluate or from_ir or emit_ir is not None):
+            compile_cache = cache.CompileCache(args["cache_dir"], args["cache_size"])
+            # everything besides the source that changes the output
+            key_options = {
+                "peephole": args["peephole"],
+                "dense_tacky": args["dense_tacky"],
+                "fused_lowering": args["fused_lowering"],
+            }
+            if mmap_lexer:
+                cache_key = compile_cache.key_file(preprocessed_file, option, args["optimize"], **key_options)
+            else:
+                cache_key = compile_cache.key(source, option, args["optimize"], **key_options)
+            assembly_text = compile_cache.get(cache_key)
+            cache_hit = assembly_text is not None
+
+        if cache_hit:
+            # the same output as a miss, whatever the cache holds
+            out.extend(stage_messages(OPTION_STAGES[option]))
+        else:
+            # on a miss, functions that did not change since they were last
+            # compiled still come from the cache; the encoder needs the
+            # whole AssemblyProgram, so --integrated-as compiles everything
+            incremental = compile_cache is not None and option in ("", "-S") and not args["integrated_as"]
+            context = compiler.CompilationContext(
+                optimize=args["optimize"],
+                trace=args["trace"],
+                recorder=recorder,
+                dense_tacky=args["dense_tacky"],
+                fused_lowering=args["fused_lowering"],
+                function_cache=compile_cache if incremental else None,
+                peephole=args["peephole"]
+            )
+            stop_at = "assembly" if incremental else OPTION_STAGES[option]
+            if args["interpret"] and option == "":
+                stop_at = "tacky"
+            try:
+                if from_ir:
+                    compiled = compiler.compile_ir(ir, serializer.KIND_STAGES[kind], stop_at, context=context)
+                elif mmap_lexer:
+                    compiled = compiler.compile_file(preprocessed_file, stop_at=stop_at, context=context)
+                else:
+                    compiled = compiler.compile_source(source, stop_at=stop_at, context=context)
+            except compiler.CompileError as e:
+                out.extend(stage_messages(e.stage))
+                raise
+            finally:
+                err.extend(context.diagnostics)
+            out.extend(stage_messages(stop_at))
+            peephole_hits = context.peephole_hits
+            if emit_ir is not None:
+                # the IR of the last stage that ran, e.g. the AssemblyProgram
+                # for -S and full builds
+                field, _ = compiler.RESUME_POINTS[stop_at]
+                with recorder.phase("emit_ir") as sizes:
+                    sizes["ir_bytes"] = serializer.dump_file(getattr(compiled, field), emit_ir)
+                out.append(f"IR file created at {emit_ir}")
+            if mmap_lexer and compiled.tokens is not None:
+                # compile_file leaves the mapping open when it stops at lex
+                compiled.tokens.close()
+            assembly_program = compiled.assembly_program if option in ("", "-S") and not incremental else None
+            tacky_program = compiled.tacky_program
+            if incremental:
+                assembly_text = compiled.assembly
+
+            # the cache needs the text, and with stats emitting to memory
+            # first lets emission and assembly be timed separately
+            timed_emit = recorder is not stats.NULL_RECORDER and not (args["integrated_as"] or args["run"])
+            if assembly_program is not None and (compile_cache is not None or timed_emit):
+                with recorder.phase("emit") as sizes:
+                    assembly_text = emitter.generate_assembly(assembly_program)
+                    sizes["assembly_bytes"] = len(assembly_text)
+            if compile_cache is not None:
+                compile_cache.put(cache_key, assembly_text or "")
+    except Exception as e:
+        err.append(f"Error: {e}")
+        return BuildResult(1, out, err, cache_hit)
+    finally:
+        if mmap_lexer and not save_temps:
+            remove_file(preprocessed_file)
+
+    if args["peephole_stats"] and peephole_hits is not None:
+        err.extend(peephole.format_hits(peephole_hits))
+
+    if option in ("--lex", "--parse", "--tacky", "--codegen"):
+        return BuildResult(0, out, err, cache_hit)
+
+    if args["interpret"] and option == "":
+        return evaluate_in_process(interpreter.interpret, tacky_program, "interpret", recorder, out, err)
+    if args["run"] and option == "":
+        import jit
+        return evaluate_in_process(jit.run_program, assembly_program, "run", recorder, out, err)
+
+    def write_assembly(stream):
+        if assembly_text is not None:
+            stream.write(assembly_text)
+        else:
+            emitter.write_assembly(program=assembly_program, stream=stream)
+
+    # Emission
+    if option == "-S" or save_temps:
+        try:
+            out.append(f"Assembly file created at {assembly_file}")
+            with open(assembly_file, "w") as f:
+                write_assembly(f)
+        except Exception as e:
+            err.append(f"Error: {e}")
+            return BuildResult(1, out, err, cache_hit)
+
+    if option == "-S":
+        return BuildResult(0, out, err, cache_hit)
+
+    # a cache hit only has the assembly text, which still goes through gcc
+    if args["integrated_as"] and assembly_program is not None:
+        return encode_and_link(assembly_program, output_file, link, recorder, out, err, cache_hit)
+
+    # Assemble (and link), reading the assembly from stdin
+    assemble_cmd = ["gcc", "-x", "assembler", "-", "-o", output_file]
+    if not link:
+        assemble_cmd.insert(1, "-c")
+    try:
+        with recorder.phase("assemble") as sizes:
+            returncode, stderr = run_with_input(assemble_cmd, write_assembly)
+            if returncode == 0:
+                sizes["output_bytes"] = os.path.getsize(output_file)
+    except Exception as e:
+        err.append(f"Error: {e}")
+        return BuildResult(1, out, err, cache_hit)
+    if returncode != 0:
+        err.append(stderr.rstrip("\n"))
+        err.append("Error: Assembly and linking failed.")
+        return BuildResult(1, out, err, cache_hit)
+
+    if link:
+        out.append(f"Executable created at {output_file}")
+    return BuildResult(0, out, err, cache_hit)
+
+def stream_build(source, preprocessed_file, assembly_file, output_file, args, link, recorder):
+    """
+    Compiles one function at a time straight into the assembler's stdin, or
+    into the .s file for -S and --save-temps, so only one function's IRs
+    are alive at any time.
+    """
+    out = []
+    err = []
+    option = args["option"]
+    mmap_lexer = args["mmap_lexer"]
+    save_temps = args["save_temps"]
+    context = compiler.CompilationContext(
+        optimize=args["optimize"],
+        trace=args["trace"],
+        recorder=recorder,
+        dense_tacky=args["dense_tacky"],
+        fused_lowering=args["fused_lowering"],
+        peephole=args["peephole"]
+    )
+    failures = []
+
+    def write_assembly(stream):
+        # a CompileError is kept for later, so the assembler is still waited for
+        try:
+            if mmap_lexer:
+                compiler.stream_file(preprocessed_file, stream, context=context)
+            else:
+                compiler.stream_source(source, stream, context=context)
+        except compiler.CompileError as e:
+            failures.append(e)
+
+    to_file = option == "-S" or save_temps
+    returncode, stderr = 0, ""
+    try:
+        if save_temps and not mmap_lexer:
+            with open(preprocessed_file, "w") as f:
+                f.write(source)
+        if to_file:
+            with open(assembly_file, "w") as f:
+                write_assembly(f)
+
+        if option == "" and not failures:
+            if to_file:
+                assemble_cmd = ["gcc", "-x", "assembler", assembly_file, "-o", output_file]
+            else:
+                assemble_cmd = ["gcc", "-x", "assembler", "-", "-o", output_file]
+            if not link:
+                assemble_cmd.insert(1, "-c")
+            # when piping, compilation runs inside this phase
+            with recorder.phase("assemble") as sizes:
+                if to_file:
+                    assembled = subprocess.run(assemble_cmd, capture_output=True, text=True)
+                    returncode, stderr = assembled.returncode, assembled.stderr
+                else:
+                    returncode, stderr = run_with_input(assemble_cmd, write_assembly)
+                if returncode == 0 and not failures:
+                    sizes["output_bytes"] = os.path.getsize(output_file)
+    except Exception as e:
+        err.append(f"Error: {e}")
+        return BuildResult(1, out, err)
+    finally:
+        if mmap_lexer and not save_temps:
+            remove_file(preprocessed_file)
+
+    err.extend(context.diagnostics)
+    if failures:
+        # whatever was written before the error is incomplete
+        remove_file(assembly_file if to_file else output_file)
+        out.extend(stage_messages(failures[0].stage))
+        err.append(f"Error: {failures[0]}")
+        return BuildResult(1, out, err)
+
+    out.extend(stage_messages("codegen"))
+    if args["peephole_stats"]:
+        err.extend(peephole.format_hits(context.peephole_hits))
+    if to_file:
+        out.append(f"Assembly file created at {assembly_file}")
+    if option == "-S":
+        return BuildResult(0, out, err)
+
+    if returncode != 0:
+        err.append(stderr.rstrip("\n"))
+        err.append("Error: Assembly and linking failed.")
+        return BuildResult(1, out, err)
+
+    if link:
+        out.append(f"Executable created at {output_file}")
+    return BuildResult(0, out, err)
+
+def evaluate_in_process(evaluate, program, phase, recorder, out, err):
+    # gets main's return value in this process instead of writing an
+    # executable, by running the generated code or interpreting TACKY
+    try:
+        with recorder.phase(phase) as sizes:
+            value = evaluate(program)
+            sizes["return_value"] = value
+    except Exception as e:
+        err.append(f"Error: {e}")
+        return BuildResult(1, out, err)
+
+    result = BuildResult(0, out, err)
+    # as jit.exit_status, without loading ctypes for --interpret
+    result.exit_status = value & 0xFF
+    return result
+
+def encode_and_link(assembly_program, output_file, link, recorder, out, err, cache_hit):
+    # writes the object file directly; gcc is only run to link it
+    import encoder
+    object_file = f"{output_file}.o" if link else output_file
+    try:
+        with recorder.phase("encode") as sizes:
+            sizes["object_bytes"] = encoder.write_object(assembly_program, object_file)
+        if not link:
+            return BuildResult(0, out, err, cache_hit)
+        with recorder.phase("link") as sizes:
+            result = subprocess.run(["gcc", object_file, "-o", output_file], capture_output=True, text=True)
+            if result.returncode == 0:
+                sizes["output_bytes"] = os.path.getsize(output_file)
+    except Exception as e:
+        err.append(f"Error: {e}")
+        return BuildResult(1, out, err, cache_hit)
+    finally:
+        if link:
+            remove_file(object_file)
+    if result.returncode != 0:
+        err.append(result.stderr.rstrip("\n"))
+        err.append("Error: Linking failed.")
+        return BuildResult(1, out, err, cache_hit)
+
+    out.append(f"Executable created at {output_file}")
+    return BuildResult(0, out, err, cache_hit)
+
+def build_files(input_files, args, link=True):
+    # executor.map keeps results in input order
+    jobs = min(args["jobs"], len(input_files))
+    if jobs <= 1:
+        return [build_file(input_file, args, link) for input_file in input_files]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(build_file, input_files, repeat(args), repeat(link)))
+
+def main(argv):
+    args = parse_args(argv)
+    input_files = args["input_files"]
+    output_file = args["output_file"]
+
+    if not input_files:
+        print("Error: No input files.", file=sys.stderr)
+        return 1
+    if args["emit_ir"] is not None and len(input_files) > 1:
+        print("Error: --emit-ir takes a single input file.", file=sys.stderr)
+        return 1
+
+    # with -o every file becomes an object file and they are linked together
+    link_together = output_file is not None and args["option"] == "" and not (args["run"] or args["interpret"])
+
+    if args["profile"] is not None:
+        # worker processes are not profiled, so profile a serial build
+        import cProfile
+        import pstats
+        args["jobs"] = 1
+        profiler = cProfile.Profile()
+        results = profiler.runcall(build_files, input_files, args, link=not link_together)
+        profiler.dump_stats(args["profile"])
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
     else:
-        input_file = arg
-
-base_name, _ = os.path.splitext(input_file)
-preprocessed_file = f"{base_name}.i"
-assembly_file = f"{base_name}.s"
-output_file = base_name
-
-# Preprocessing
-preprocess_cmd = ["gcc", "-E", "-P", input_file, "-o", preprocessed_file]
-if subprocess.run(preprocess_cmd).returncode != 0:
-    print("Error: Preprocessing failed.", file=sys.stderr)
-    sys.exit(1)
-
-# Lexing
-try:
-    print("Lexing completed (stub)")
-    f1 = open(preprocessed_file, "r")
-    f1_content = f1.read()
-    f1.close()
-    tokens = lexer.tokenize(f1_content)
-except Exception:
-    sys.exit(1)
-
-if option == "--lex":
-    if os.path.exists(preprocessed_file):
-        os.remove(preprocessed_file)
-    sys.exit(0)
-
-# Parsing
-try:
-    print("Parsing completed (stub)")
-    program = parser.parse_program(tokens)
-except Exception:
-    sys.exit(1)
-
-if option == "--parse":
-    if os.path.exists(preprocessed_file):
-        os.remove(preprocessed_file)
-    sys.exit(0)
-
-# Tacky
-try:
-    print("Tacky completed (stub)")
-    tacky_program = tacky.tacky_translate(program)
-except Exception:
-    sys.exit(1)
-
-if option == "--tacky":
-    if os.path.exists(preprocessed_file):
-        os.remove(preprocessed_file)
-    sys.exit(0)
-
-# Generation
-try:
-    print("Code generation completed (stub)")
-    assembly_program = generator.translate(tacky_program)
-except Exception:
-    sys.exit(1)
-
-if option == "--codegen":
-    if os.path.exists(preprocessed_file):
-        os.remove(preprocessed_file)
-    sys.exit(0)
-
-# Emission
-try:
-    print(f"Assembly file created at {assembly_file}")
-    emitter.write_assembly(program=assembly_program, filename=assembly_file)
-except Exception:
-    sys.exit(1)
-
-if option == "-S":
-    if os.path.exists(preprocessed_file):
-        os.remove(preprocessed_file)
-
-# Assemble and link
-assemble_cmd = ["gcc", assembly_file, "-o", output_file]
-if subprocess.run(assemble_cmd).returncode != 0:
-    print("Error: Assembly and linking failed.", file=sys.stderr)
-    if os.path.exists(assembly_file):
-        os.remove(assembly_file)
-    sys.exit(1)
-if os.path.exists(assembly_file):
-    os.remove(assembly_file)
-
-print(f"Executable created at {output_file}")
-sys.exit(0)
+        results = build_files(input_files, args, link=not link_together)
+
+    failed = False
+    for input_file, result in zip(input_files, results):
+        for line in result.out:
+            print(line)
+        for line in result.err:
+            prefix = f"{input_file}: " if len(input_files) > 1 else ""
+            print(f"{prefix}{line}", file=sys.stderr)
+        failed = failed or result.returncode != 0
+
+    # with --run / --interpret a single program's exit status becomes the
+    # driver's own, as if the executable had been run; with several files
+    # each is printed
+    run_status = None
+    if (args["run"] or args["interpret"]) and args["option"] == "" and not failed:
+        if len(input_files) == 1:
+            run_status = results[0].exit_status
+        else:
+            for input_file, result in zip(input_files, results):
+                print(f"{input_file}: exit status {result.exit_status}")
+
+    if args["stats"]:
+        for input_file, result in zip(input_files, results):
+            print(f"{input_file}:", file=sys.stderr)
+            for line in stats.format_phases(result.phases):
+                print(f"  {line}", file=sys.stderr)
+    if args["stats_json"] is not None:
+        with open(args["stats_json"], "w") as f:
+            json.dump({
+                "files": [
+                    {"file": input_file, "returncode": result.returncode, "phases": result.phases}
+                    for input_file, result in zip(input_files, results)
+                ]
+            }, f, indent=2)
+
+    if args["cache_dir"] is not None:
+        cache.CompileCache(args["cache_dir"], args["cache_size"]).evict()
+        if args["cache_stats"]:
+            hits = sum(1 for result in results if result.cache_hit)
+            misses = sum(1 for result in results if result.cache_hit is False)
+            print(f"cache: {hits} hits, {misses} misses", file=sys.stderr)
+
+    if link_together:
+        object_files = [f"{os.path.splitext(input_file)[0]}.o" for input_file in input_files]
+        if not failed:
+            link_cmd = ["gcc", *object_files, "-o", output_file]
+            if subprocess.run(link_cmd).returncode != 0:
+                print("Error: Linking failed.", file=sys.stderr)
+                failed = True
+            else:
+                print(f"Executable created at {output_file}")
+        for object_file in object_files:
+            remove_file(object_file)
+
+    if failed:
+        return 1
+    return run_status or 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
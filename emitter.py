@@ -1,56 +1,111 @@
+import io
+from functools import lru_cache
+
 from generator import *
 
+REGISTER_NAMES = {
+    AX: "%eax",
+    CX: "%ecx",
+    DX: "%edx",
+    SI: "%esi",
+    DI: "%edi",
+    R8: "%r8d",
+    R9: "%r9d",
+    R10: "%r10d",
+    R11: "%r11d",
+}
+
+UNARY_OPERATOR_NAMES = {
+    Neg: "negl",
+    Not: "notl",
+}
+
 def convert_unary_operator(op: UnaryOperator):
-    if isinstance(op, Neg):
-        return "negl"
-    elif isinstance(op, Not):
-        return "notl"
+    return UNARY_OPERATOR_NAMES[type(op)]
+
+# frames only use a handful of distinct offsets and immediates, so their
+# strings are formatted once and reused
+@lru_cache(maxsize=4096)
+def convert_stack(offset: int):
+    return f"{offset}(%rbp)"
+
+@lru_cache(maxsize=4096)
+def convert_imm(value):
+    return f"${value}"
+
+OPERAND_FORMATTERS = {
+    Imm: lambda op: convert_imm(op.value),
+    Reg: lambda op: REGISTER_NAMES[type(op.reg)],
+    Stack: lambda op: convert_stack(op.int),
+}
 
 def convert_operand(op: Operand):
-    if isinstance(op, Imm):
-        return f"${str(op.value)}"
-    elif isinstance(op, Reg):
-        if isinstance(op.reg, AX):
-            return f"%eax"
-        elif isinstance(op.reg, R10):
-            return f"%r10d"
-    elif isinstance(op, Stack):
-        return f"{op.int}(%rbp)"
+    return OPERAND_FORMATTERS[type(op)](op)
+
+def convert_mov(instr: MovAssemblyInstruction):
+    return f"movl {convert_operand(instr.src)}, {convert_operand(instr.dst)}"
+
+def convert_ret(instr: RetAssemblyInstruction):
+    return "movq %rbp, %rsp\n\tpopq %rbp\n\tret"
+
+def convert_unary(instr: UnaryAssemblyInstruction):
+    return f"{convert_unary_operator(instr.unary_operator)} {convert_operand(instr.operand)}"
+
+def convert_allocate_stack(instr: AllocateStackAssemblyInstruction):
+    return f"subq ${instr.int}, %rsp"
+
+INSTRUCTION_FORMATTERS = {
+    MovAssemblyInstruction: convert_mov,
+    RetAssemblyInstruction: convert_ret,
+    UnaryAssemblyInstruction: convert_unary,
+    AllocateStackAssemblyInstruction: convert_allocate_stack,
+}
 
 def convert_instr(instr: AssemblyInstruction):
-    if isinstance(instr, MovAssemblyInstruction):
-        src = convert_operand(instr.src)
-        dst = convert_operand(instr.dst)
-        return f"movl {src}, {dst}"
-    elif isinstance(instr, RetAssemblyInstruction):
-        return f"movq %rbp, %rsp\n\tpopq %rbp\n\tret"
-    elif isinstance(instr, UnaryAssemblyInstruction):
-        operator = convert_unary_operator(instr.unary_operator)
-        operand = convert_operand(instr.operand)
-        return f"{operator} {operand}"
-    elif isinstance(instr, AllocateStackAssemblyInstruction):
-        return f"subq ${instr.int}, %rsp"
+    return INSTRUCTION_FORMATTERS[type(instr)](instr)
 
-def generate_assembly(program: AssemblyProgram):
-    result = ""
+# ends every file, after the functions
+GNU_STACK_NOTE = "\t.section .note.GNU-stack,\"\",@progbits\n"
 
-    result += f"\t.globl {program.function_definition.name.value}\n"
-    result += f"{program.function_definition.name.value}:\n"
-    result += f"\tpushq %rbp\n"
-    result += f"\tmovq %rsp, %rbp\n"
+def emit_function(function_definition: AssemblyFunctionDefinition, stream):
+    # writes one line at a time, so the text never has to be held in memory
+    write = stream.write
+    formatters = INSTRUCTION_FORMATTERS
+    name = function_definition.name.value
 
-    for instr in program.function_definition.instructions:
-        result += "\t" + convert_instr(instr) + "\n"
+    write(f"\t.globl {name}\n")
+    write(f"{name}:\n")
+    write("\tpushq %rbp\n")
+    write("\tmovq %rsp, %rbp\n")
 
-    result += f"\t.section .note.GNU-stack,\"\",@progbits\n"
+    for instr in function_definition.instructions:
+        write(f"\t{formatters[type(instr)](instr)}\n")
 
-    return result
+def emit_assembly(program: AssemblyProgram, stream):
+    for function_definition in program.function_definitions:
+        emit_function(function_definition, stream)
+    stream.write(GNU_STACK_NOTE)
+
+def generate_function(function_definition: AssemblyFunctionDefinition):
+    # the text of one function; a file is its functions' text followed by
+    # GNU_STACK_NOTE
+    buffer = io.StringIO()
+    emit_function(function_definition, buffer)
+    return buffer.getvalue()
+
+def generate_assembly(program: AssemblyProgram):
+    buffer = io.StringIO()
+    emit_assembly(program, buffer)
+    return buffer.getvalue()
 
-def write_assembly(program: AssemblyProgram, filename: str):
-    text = generate_assembly(program)
+def write_assembly(program: AssemblyProgram, filename: str = None, stream=None):
+    # stream can be any writable text stream (a pipe, sys.stdout, ...)
+    if stream is not None:
+        emit_assembly(program, stream)
+        return
 
     with open(filename, "w") as f:
-        f.write(text)
+        emit_assembly(program, f)
 
 # x = """int main(void) {
 #     return ~12;
@@ -0,0 +1,249 @@
+"""
+x86-64 machine code encoder and ELF64 object writer.
+
+Encodes an AssemblyProgram straight to the bytes `as` would produce for the
+emitter's text, and wraps them in a relocatable ELF64 object:
+
+section            contents
+-----------------  ---------------------------------------------------
+.text              the function bodies, back to back
+.note.GNU-stack    empty; marks the stack as non-executable
+.symtab            a local section symbol and one global per function
+.strtab            function names
+.shstrtab          section names
+
+Only the instruction forms the generator produces are supported: movl,
+negl and notl on Imm/Reg/Stack operands, subq for the stack allocation and
+the fixed push/mov/pop/ret prologue and epilogue. The code never refers to
+other symbols, so no relocations are needed.
+"""
+
+import struct
+
+from generator import *
+
+# register numbers as used in ModRM/REX; the high bit goes into REX
+REGISTER_NUMBERS = {
+    AX: 0,
+    CX: 1,
+    DX: 2,
+    SI: 6,
+    DI: 7,
+    R8: 8,
+    R9: 9,
+    R10: 10,
+    R11: 11,
+}
+
+RBP = 5
+
+# /digit opcode extensions of the F7 group
+UNARY_OPCODE_EXTENSIONS = {
+    Neg: 3,
+    Not: 2,
+}
+
+# pushq %rbp; movq %rsp, %rbp
+PROLOGUE = b"\x55\x48\x89\xe5"
+# movq %rbp, %rsp; popq %rbp; ret
+EPILOGUE = b"\x48\x89\xec\x5d\xc3"
+
+def fits_int8(value: int):
+    return -128 <= value <= 127
+
+def fits_int64(value):
+    # constant text is measured without converting all of a huge literal
+    if isinstance(value, str):
+        digits = value.lstrip("0")
+        if len(digits) > 22:
+            return False
+        value = int(digits or "0", 8 if value[0] == "0" else 10)
+    return -(1 << 64) < value < (1 << 64)
+
+def encode_imm32(value):
+    # as keeps the low 32 bits of anything that fits in 64 (with a warning
+    # past 32) and rejects the rest
+    if not fits_int64(value):
+        raise ValueError(f"Immediate {value} does not fit in 64 bits!")
+    return struct.pack("<I", constant_value(value) & 0xFFFFFFFF)
+
+def encode_rex(reg: int, rm: int, wide: bool = False):
+    bits = (8 if wide else 0) | ((reg >> 3) << 2) | (rm >> 3)
+    return bytes((0x40 | bits,)) if bits else b""
+
+def encode_modrm(opcode: bytes, reg: int, op: Operand):
+    """
+    REX prefix, opcode, ModRM byte and displacement for an instruction whose
+    r/m operand is op and whose reg field is reg (a register or a /digit).
+    """
+    if isinstance(op, Reg):
+        rm = REGISTER_NUMBERS[type(op.reg)]
+        return encode_rex(reg, rm) + opcode + bytes((0xC0 | (reg & 7) << 3 | rm & 7,))
+    if isinstance(op, Stack):
+        # -N(%rbp); rbp as a base always needs a displacement, even 0
+        offset = op.int
+        if fits_int8(offset):
+            return encode_rex(reg, RBP) + opcode + struct.pack("<Bb", 0x40 | (reg & 7) << 3 | RBP, offset)
+        return encode_rex(reg, RBP) + opcode + struct.pack("<Bi", 0x80 | (reg & 7) << 3 | RBP, offset)
+    raise ValueError(f"Cannot encode operand {type(op).__name__}!")
+
+def encode_mov(instr: MovAssemblyInstruction):
+    src, dst = instr.src, instr.dst
+    if isinstance(src, Imm):
+        if isinstance(dst, Reg):
+            # B8+r id, the short form as picks for registers
+            number = REGISTER_NUMBERS[type(dst.reg)]
+            return encode_rex(0, number) + bytes((0xB8 + (number & 7),)) + encode_imm32(src.value)
+        return encode_modrm(b"\xc7", 0, dst) + encode_imm32(src.value)
+    if isinstance(src, Reg):
+        return encode_modrm(b"\x89", REGISTER_NUMBERS[type(src.reg)], dst)
+    if isinstance(src, Stack) and isinstance(dst, Reg):
+        return encode_modrm(b"\x8b", REGISTER_NUMBERS[type(dst.reg)], src)
+    raise ValueError(f"Cannot encode movl from {type(src).__name__} to {type(dst).__name__}!")
+
+def encode_ret(instr: RetAssemblyInstruction):
+    return EPILOGUE
+
+def encode_unary(instr: UnaryAssemblyInstruction):
+    return encode_modrm(b"\xf7", UNARY_OPCODE_EXTENSIONS[type(instr.unary_operator)], instr.operand)
+
+def encode_allocate_stack(instr: AllocateStackAssemblyInstruction):
+    # subq $n, %rsp: 48 83 /5 ib, or 48 81 /5 id for larger frames
+    if fits_int8(instr.int):
+        return struct.pack("<3sb", b"\x48\x83\xec", instr.int)
+    return struct.pack("<3si", b"\x48\x81\xec", instr.int)
+
+INSTRUCTION_ENCODERS = {
+    MovAssemblyInstruction: encode_mov,
+    RetAssemblyInstruction: encode_ret,
+    UnaryAssemblyInstruction: encode_unary,
+    AllocateStackAssemblyInstruction: encode_allocate_stack,
+}
+
+def encode_instr(instr: AssemblyInstruction):
+    return INSTRUCTION_ENCODERS[type(instr)](instr)
+
+def encode_function(function_definition: AssemblyFunctionDefinition, code: bytearray):
+    # appends to code, so functions can be laid out back to back
+    encoders = INSTRUCTION_ENCODERS
+    code += PROLOGUE
+    for instr in function_definition.instructions:
+        code += encoders[type(instr)](instr)
+
+def encode_program(program: AssemblyProgram):
+    """
+    Returns (code, symbols): the .text bytes and a (name, offset) pair for
+    each function.
+    """
+    code = bytearray()
+    symbols = []
+    for function_definition in program.function_definitions:
+        symbols.append((function_definition.name.value, len(code)))
+        encode_function(function_definition, code)
+    return code, symbols
+
+# ELF64 constants
+ELF_HEADER = struct.Struct("<16sHHIQQQIHHHHHH")
+SECTION_HEADER = struct.Struct("<IIQQQQIIQQ")
+SYMBOL = struct.Struct("<IBBHQQ")
+
+ET_REL = 1
+EM_X86_64 = 62
+EV_CURRENT = 1
+ELF_IDENT = b"\x7fELF" + bytes((2, 1, EV_CURRENT, 0)) + bytes(8)
+
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STT_NOTYPE = 0
+STT_SECTION = 3
+
+TEXT_INDEX = 1
+
+def align(offset: int, alignment: int):
+    return (offset + alignment - 1) & -alignment
+
+def string_table(names):
+    # returns the table and each name's offset in it
+    table = bytearray(b"\0")
+    offsets = []
+    for name in names:
+        offsets.append(len(table))
+        table += name.encode() + b"\0"
+    return bytes(table), offsets
+
+def object_bytes(program: AssemblyProgram):
+    code, symbols = encode_program(program)
+
+    strtab, name_offsets = string_table(name for name, _ in symbols)
+    symtab = bytearray(SYMBOL.size)
+    symtab += SYMBOL.pack(0, STB_LOCAL << 4 | STT_SECTION, 0, TEXT_INDEX, 0, 0)
+    first_global = 2
+    for name_offset, (_, offset) in zip(name_offsets, symbols):
+        symtab += SYMBOL.pack(name_offset, STB_GLOBAL << 4 | STT_NOTYPE, 0, TEXT_INDEX, offset, 0)
+
+    section_names = [".text", ".note.GNU-stack", ".symtab", ".strtab", ".shstrtab"]
+    shstrtab, section_name_offsets = string_table(section_names)
+
+    # (type, flags, contents, link, info, alignment, entry size), after the
+    # null section; .symtab links to .strtab (index 4)
+    sections = [
+        (SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, bytes(code), 0, 0, 1, 0),
+        (SHT_PROGBITS, 0, b"", 0, 0, 1, 0),
+        (SHT_SYMTAB, 0, bytes(symtab), 4, first_global, 8, SYMBOL.size),
+        (SHT_STRTAB, 0, strtab, 0, 0, 1, 0),
+        (SHT_STRTAB, 0, shstrtab, 0, 0, 1, 0),
+    ]
+
+    body = bytearray()
+    headers = bytearray(SECTION_HEADER.size)
+    for name_offset, (kind, flags, contents, link, info, alignment, entry_size) in zip(section_name_offsets, sections):
+        offset = align(ELF_HEADER.size + len(body), alignment)
+        body += bytes(offset - ELF_HEADER.size - len(body))
+        body += contents
+        headers += SECTION_HEADER.pack(name_offset, kind, flags, 0, offset, len(contents), link, info, alignment, entry_size)
+
+    section_headers_offset = align(ELF_HEADER.size + len(body), 8)
+    body += bytes(section_headers_offset - ELF_HEADER.size - len(body))
+    header = ELF_HEADER.pack(
+        ELF_IDENT, ET_REL, EM_X86_64, EV_CURRENT, 0, 0, section_headers_offset,
+        0, ELF_HEADER.size, 0, 0, SECTION_HEADER.size, len(sections) + 1, len(sections)
+    )
+    return header + bytes(body) + bytes(headers)
+
+def write_object(program: AssemblyProgram, filename: str = None, stream=None):
+    # stream can be any writable binary stream
+    data = object_bytes(program)
+    if stream is not None:
+        stream.write(data)
+        return len(data)
+
+    with open(filename, "wb") as f:
+        f.write(data)
+    return len(data)
+
+def text_section(data: bytes):
+    """
+    Returns the contents of the .text section of an ELF64 object, such as
+    one written by `as`; used to compare the encoder's output against it.
+    """
+    header = ELF_HEADER.unpack_from(data)
+    section_headers_offset, entry_size, count, names_index = header[6], header[11], header[12], header[13]
+
+    def section(index):
+        return SECTION_HEADER.unpack_from(data, section_headers_offset + index * entry_size)
+
+    names = section(names_index)
+    for index in range(count):
+        fields = section(index)
+        name_start = names[4] + fields[0]
+        name = data[name_start:data.index(b"\0", name_start)]
+        if name == b".text":
+            return data[fields[4]:fields[4] + fields[5]]
+    raise ValueError("No .text section!")
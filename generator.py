@@ -1,92 +1,155 @@
 """
 Assembly program:
 
-program = Program(function_definition)
+program = Program(function_definition*)
 function_definition = Function(identifier name, instruction* instructions)
 instruction = Mov(operand src, operand dst) | Ret
-operand = Imm(int) | Register
+operand = Imm(int) | Reg(reg) | Pseudo(identifier) | Stack(int)
+reg = AX | CX | DX | SI | DI | R8 | R9 | R10 | R11
 
 """
 
+import heapq
 from typing import List
 
 class RegType:
-    pass
+    __slots__ = ()
 
 class AX(RegType):
-    pass
+    __slots__ = ()
+
+class CX(RegType):
+    __slots__ = ()
+
+class DX(RegType):
+    __slots__ = ()
+
+class SI(RegType):
+    __slots__ = ()
+
+class DI(RegType):
+    __slots__ = ()
+
+class R8(RegType):
+    __slots__ = ()
+
+class R9(RegType):
+    __slots__ = ()
 
 class R10(RegType):
-    pass
+    __slots__ = ()
+
+class R11(RegType):
+    __slots__ = ()
 
 class AssemblyASTNode:
-    pass
+    __slots__ = ()
 
 class Operand(AssemblyASTNode):
-    pass
+    __slots__ = ()
 
 class Imm(Operand):
+    __slots__ = ("value",)
+
     def __init__(self, value: int):
         self.value = value
 
 class Reg(Operand):
+    __slots__ = ("reg",)
+
     def __init__(self, reg: RegType):
         self.reg = reg
 
 class Pseudo(Operand):
+    __slots__ = ("identifier",)
+
     def __init__(self, identifier: str):
         self.identifier = identifier
 
 class Stack(Operand):
+    __slots__ = ("int",)
+
     def __init__(self, int: int):
         self.int = int
 
 class AssemblyInstruction(AssemblyASTNode):
-    pass
+    __slots__ = ()
 
 class MovAssemblyInstruction(AssemblyInstruction):
+    __slots__ = ("src", "dst")
+
     def __init__(self, src: Operand, dst: Operand):
         self.src = src
         self.dst = dst
 
 class UnaryOperator(AssemblyASTNode):
-    pass
+    __slots__ = ()
 
 class Neg(UnaryOperator):
-    pass
+    __slots__ = ()
 
 class Not(UnaryOperator):
-    pass
+    __slots__ = ()
 
 class UnaryAssemblyInstruction(AssemblyInstruction):
+    __slots__ = ("unary_operator", "operand")
+
     def __init__(self, unary_operator: UnaryOperator, operand: Operand):
         self.unary_operator = unary_operator
         self.operand = operand
 
 class AllocateStackAssemblyInstruction(AssemblyInstruction):
+    __slots__ = ("int",)
+
     def __init__(self, int: int):
         self.int = int
 
 class RetAssemblyInstruction(AssemblyInstruction):
-    pass
+    __slots__ = ()
 
 class AssemblyIdentifier(AssemblyASTNode):
+    __slots__ = ("value",)
+
     def __init__(self, value: str):
         self.value = value
 
 class AssemblyFunctionDefinition(AssemblyASTNode):
-    def __init__(self, name: AssemblyIdentifier, instructions: List[AssemblyInstruction]):
+    __slots__ = ("name", "instructions", "stack_size")
+
+    def __init__(self, name: AssemblyIdentifier, instructions: List[AssemblyInstruction], stack_size: int = 0):
         self.name = name
         self.instructions = instructions
+        # bytes reserved below %rbp for stack slots
+        self.stack_size = stack_size
 
 class AssemblyProgram(AssemblyASTNode):
-    def __init__(self, function_definition: AssemblyFunctionDefinition):
-        self.function_definition = function_definition
+    __slots__ = ("function_definitions",)
+
+    def __init__(self, function_definitions: List[AssemblyFunctionDefinition]):
+        self.function_definitions = function_definitions
+
+# shared operator and register instances
+NEG = Neg()
+NOT = Not()
+AX_REG = Reg(AX())
+CX_REG = Reg(CX())
+DX_REG = Reg(DX())
+SI_REG = Reg(SI())
+DI_REG = Reg(DI())
+R8_REG = Reg(R8())
+R9_REG = Reg(R9())
+R10_REG = Reg(R10())
+R11_REG = Reg(R11())
+
+# registers the allocator may hand out: AX is reserved for the return value
+# and R10 for fixing up memory-to-memory moves; all of these are caller-saved,
+# so no prologue/epilogue changes are needed
+ALLOCATABLE_REGISTERS = [CX_REG, DX_REG, SI_REG, DI_REG, R8_REG, R9_REG, R11_REG]
 
 """
 AST node                        Assembly construct
 ------------------------------------------------------------
-Program(function_definition)    Program(function_definition)
+Program(function_definition*)   Program(function_definition*)
 Function(name, body)            Function(name, instructions)
 Return(exp)                     Mov(exp, Register)
                                 Ret
@@ -96,16 +159,123 @@ Constant(int)                   Imm(int)
 
 from tacky import *
 
-def translate(program: TackyProgram):
-    # first pass
+def instruction_operands(instr: AssemblyInstruction):
+    if isinstance(instr, MovAssemblyInstruction):
+        return (instr.src, instr.dst)
+    elif isinstance(instr, UnaryAssemblyInstruction):
+        return (instr.operand,)
+    return ()
+
+def live_intervals(instructions: List[AssemblyInstruction]):
+    # the code is straight-line, so a pseudoregister is live from its first
+    # mention to its last one; intervals come out ordered by start
+    intervals = {}
+    for index, instr in enumerate(instructions):
+        for operand in instruction_operands(instr):
+            if isinstance(operand, Pseudo):
+                interval = intervals.get(operand.identifier)
+                if interval is None:
+                    intervals[operand.identifier] = [index, index]
+                else:
+                    interval[1] = index
+    return intervals
+
+def replace_pseudos(instructions: List[AssemblyInstruction], assignment: dict):
+    def replace_pseudo(operand: Operand):
+        if isinstance(operand, Pseudo):
+            return assignment[operand.identifier]
+        return operand
+
+    new_instructions = []
+    for instr in instructions:
+        if isinstance(instr, MovAssemblyInstruction):
+            instr.src = replace_pseudo(instr.src)
+            instr.dst = replace_pseudo(instr.dst)
+            # coalesced move
+            if instr.src is instr.dst:
+                continue
+        elif isinstance(instr, UnaryAssemblyInstruction):
+            instr.operand = replace_pseudo(instr.operand)
+        new_instructions.append(instr)
+
+    return new_instructions
+
+def assign_stack_slots(instructions: List[AssemblyInstruction]):
+    # pseudoregisters whose live intervals do not overlap share a slot, so
+    # the frame only grows with the number of values live at the same time
+    intervals = live_intervals(instructions)
+    assignment = {}
+    free = []
+    active = []
+    offset = 0
+
+    for identifier, (start, end) in intervals.items():
+        # an interval ending where this one starts can hand over its slot:
+        # the instruction reads its operands before writing
+        while active and active[0][0] <= start:
+            _, other = heapq.heappop(active)
+            free.append(assignment[other])
+
+        if free:
+            assignment[identifier] = free.pop()
+        else:
+            offset -= 4
+            assignment[identifier] = Stack(offset)
+        heapq.heappush(active, (end, identifier))
+
+    return replace_pseudos(instructions, assignment), -1 * offset
+
+def align_stack_size(size: int):
+    # after pushq %rbp the stack pointer is 16-byte aligned, and the System V
+    # ABI wants it to stay that way
+    return (size + 15) & ~15
+
+def allocate_registers(instructions: List[AssemblyInstruction], registers: List[Reg] = ALLOCATABLE_REGISTERS):
+    # linear scan: hand out registers in interval order, and when none is
+    # free spill whichever live pseudoregister is needed furthest in the future
+    intervals = live_intervals(instructions)
+    assignment = {}
+    free = list(reversed(registers))
+    active = []
+    offset = 0
+
+    for identifier, (start, end) in intervals.items():
+        # an interval ending where this one starts can hand over its
+        # register: the instruction reads its operands before writing
+        still_active = []
+        for other in active:
+            if intervals[other][1] <= start:
+                free.append(assignment[other])
+            else:
+                still_active.append(other)
+        active = still_active
+
+        if free:
+            assignment[identifier] = free.pop()
+            active.append(identifier)
+            continue
+
+        victim = max(active, key=lambda other: intervals[other][1])
+        offset -= 4
+        if intervals[victim][1] > end:
+            assignment[identifier] = assignment[victim]
+            assignment[victim] = Stack(offset)
+            active.remove(victim)
+            active.append(identifier)
+        else:
+            assignment[identifier] = Stack(offset)
+
+    return replace_pseudos(instructions, assignment), -1 * offset
+
+def select_instructions(function_definition: TackyFunctionDefinition):
     instructions = []
 
-    for i in program.function_definition.instructions:
+    for i in function_definition.instructions:
         if isinstance(i, TackyReturn):
             if isinstance(i.val, TackyConstant):
-                instructions.append(MovAssemblyInstruction(Imm(i.val.int), Reg(AX())))
+                instructions.append(MovAssemblyInstruction(Imm(i.val.int), AX_REG))
             elif isinstance(i.val, TackyVar):
-                instructions.append(MovAssemblyInstruction(Pseudo(i.val.identifier.name_str), Reg(AX())))
+                instructions.append(MovAssemblyInstruction(Pseudo(i.val.identifier.name_str), AX_REG))
 
             instructions.append(RetAssemblyInstruction())
         elif isinstance(i, TackyUnary):
@@ -122,59 +292,194 @@ def translate(program: TackyProgram):
             instructions.append(MovAssemblyInstruction(src, dst))
             
             if isinstance(i.unary_operator, TackyComplement):
-                instructions.append(UnaryAssemblyInstruction(Not(), dst))
+                instructions.append(UnaryAssemblyInstruction(NOT, dst))
             elif isinstance(i.unary_operator, TackyNegate):
-                instructions.append(UnaryAssemblyInstruction(Neg(), dst))
+                instructions.append(UnaryAssemblyInstruction(NEG, dst))
 
-    # second pass: replacing pseudoregisters
-    identifier_to_offset = {}
-    offset = 0
+    return instructions
 
-    for instr in instructions:
-        if isinstance(instr, MovAssemblyInstruction):
-            # this is actually problematic, since both src and dst cannot be stack operands
-            if isinstance(instr.src, Pseudo):
-                if instr.src.identifier in identifier_to_offset:
-                    instr.src = Stack(identifier_to_offset[instr.src.identifier])
-                else:
-                    offset -= 4
-                    instr.src = Stack(offset)
-                    identifier_to_offset[instr.src.identifier] = offset
-            if isinstance(instr.dst, Pseudo):
-                if instr.dst.identifier in identifier_to_offset:
-                    instr.dst = Stack(identifier_to_offset[instr.dst.identifier])
-                else:
-                    offset -= 4
-                    identifier_to_offset[instr.dst.identifier] = offset
-                    instr.dst = Stack(offset)
-        elif isinstance(instr, UnaryAssemblyInstruction):
-            if isinstance(instr.operand, Pseudo):
-                if instr.operand.identifier in identifier_to_offset:
-                    instr.operand = Stack(identifier_to_offset[instr.operand.identifier])
-                else:
-                    offset -= 4
-                    instr.operand = Stack(offset)
-                    identifier_to_offset[instr.operand.identifier] = offset
+DENSE_UNARY_OPERATORS = {
+    OPERATOR_COMPLEMENT: NOT,
+    OPERATOR_NEGATE: NEG,
+}
+
+def select_dense_instructions(program: DenseTackyProgram):
+    # temporaries are already numbered, so each one gets a single Pseudo
+    # keyed by its number and no names are formatted or hashed
+    instructions = []
+    append = instructions.append
+    pseudos = [Pseudo(slot) for slot in range(program.temporary_count)]
+
+    for opcode, operator, src_kind, src_value, dst_slot in zip(
+        program.opcodes, program.operators, program.src_kinds, program.src_values, program.dst_slots
+    ):
+        src = Imm(src_value) if src_kind == SRC_CONSTANT else pseudos[src_value]
+        if opcode == OP_RETURN:
+            append(MovAssemblyInstruction(src, AX_REG))
+            append(RetAssemblyInstruction())
+        elif opcode == OP_UNARY:
+            dst = pseudos[dst_slot]
+            append(MovAssemblyInstruction(src, dst))
+            append(UnaryAssemblyInstruction(DENSE_UNARY_OPERATORS[operator], dst))
+
+    return instructions
+
+class FusedLowering:
+    """
+    Single-pass lowering of a TackyFunctionDefinition to stack-slot assembly.
+
+    Produces exactly what select_instructions, assign_stack_slots and the
+    Stack-to-Stack fix-up produce together, without building Pseudo operands
+    or walking the instructions three times. Slots are handed out and freed
+    while instructions are emitted; a cheap scan of the TACKY up front finds
+    where each temporary is last used, which is all the slot reuse needs.
+    """
+    __slots__ = ("instructions", "slots", "last_use", "free", "active", "offset")
+
+    def __init__(self, tacky_instructions: List[TackyInstruction]):
+        self.instructions = []
+        self.slots = {}
+        self.free = []
+        self.active = []
+        self.offset = 0
+
+        # every TACKY instruction lowers to two assembly instructions, the
+        # first of which (the mov) reads its source; a temporary that is
+        # never read ends at the unary instruction that writes it
+        last_use = {}
+        for index, instr in enumerate(tacky_instructions):
+            val = TACKY_SOURCES[type(instr)](instr)
+            if type(val) is TackyVar:
+                last_use[val.identifier.name_str] = 2 * index
+        self.last_use = last_use
+
+    def operand(self, val: TackyValue):
+        return OPERAND_LOWERINGS[type(val)](self, val)
+
+    def allocate(self, name: str, index: int):
+        # same policy as assign_stack_slots: slots whose interval ended by
+        # now are freed in order of end, and the last freed is reused first
+        active = self.active
+        while active and active[0][0] <= index:
+            _, other = heapq.heappop(active)
+            self.free.append(self.slots[other])
+
+        if self.free:
+            slot = self.free.pop()
+        else:
+            self.offset -= 4
+            slot = Stack(self.offset)
+        self.slots[name] = slot
+        heapq.heappush(active, (self.last_use.get(name, index + 1), name))
+        return slot
+
+    def move(self, src: Operand, dst: Operand):
+        if src is dst:
+            return
+        if type(src) is Stack and type(dst) is Stack:
+            self.instructions.append(MovAssemblyInstruction(src, R10_REG))
+            self.instructions.append(MovAssemblyInstruction(R10_REG, dst))
+        else:
+            self.instructions.append(MovAssemblyInstruction(src, dst))
+
+    def lower_return(self, instr: TackyReturn, index: int):
+        self.move(self.operand(instr.val), AX_REG)
+        self.instructions.append(RetAssemblyInstruction())
+
+    def lower_unary(self, instr: TackyUnary, index: int):
+        # the source is resolved before the destination takes a slot, since
+        # the destination may reuse the slot of a source read for the last time
+        src = self.operand(instr.src)
+        dst = self.allocate(instr.dst.identifier.name_str, 2 * index)
+        self.move(src, dst)
+        self.instructions.append(UnaryAssemblyInstruction(UNARY_LOWERINGS[type(instr.unary_operator)], dst))
+
+TACKY_SOURCES = {
+    TackyReturn: lambda instr: instr.val,
+    TackyUnary: lambda instr: instr.src,
+}
+
+OPERAND_LOWERINGS = {
+    TackyConstant: lambda lowering, val: Imm(val.int),
+    TackyVar: lambda lowering, val: lowering.slots[val.identifier.name_str],
+}
+
+UNARY_LOWERINGS = {
+    TackyComplement: NOT,
+    TackyNegate: NEG,
+}
+
+INSTRUCTION_LOWERINGS = {
+    TackyReturn: FusedLowering.lower_return,
+    TackyUnary: FusedLowering.lower_unary,
+}
+
+def translate_fused(function_definition: TackyFunctionDefinition):
+    tacky_instructions = function_definition.instructions
+    lowering = FusedLowering(tacky_instructions)
+    # the frame size is only known at the end, so the allocation is patched
+    allocate_stack = AllocateStackAssemblyInstruction(0)
+    lowering.instructions.append(allocate_stack)
+
+    lowerings = INSTRUCTION_LOWERINGS
+    for index, instr in enumerate(tacky_instructions):
+        lowerings[type(instr)](lowering, instr, index)
+
+    allocate_stack.int = align_stack_size(-1 * lowering.offset)
+    return AssemblyFunctionDefinition(
+        name=AssemblyIdentifier(function_definition.identifier.name_str),
+        instructions=lowering.instructions,
+        stack_size=allocate_stack.int
+    )
+
+def translate_function(function_definition, register_allocation: bool = False, fused: bool = False):
+    # function_definition is a TackyFunctionDefinition or a DenseTackyProgram
+
+    # fused lowering covers stack slots on TackyFunctionDefinition; register
+    # allocation may spill a value after its uses were emitted, so it needs
+    # all passes
+    if fused and not register_allocation and isinstance(function_definition, TackyFunctionDefinition):
+        return translate_fused(function_definition)
+
+    # first pass
+    if isinstance(function_definition, DenseTackyProgram):
+        name = function_definition.name
+        instructions = select_dense_instructions(function_definition)
+    else:
+        name = function_definition.identifier.name_str
+        instructions = select_instructions(function_definition)
+
+    # second pass: replacing pseudoregisters
+    if register_allocation:
+        instructions, stack_size = allocate_registers(instructions)
+    else:
+        instructions, stack_size = assign_stack_slots(instructions)
+    stack_size = align_stack_size(stack_size)
 
     # third pass: allocate stack and fix moves
-    new_instructions = [AllocateStackAssemblyInstruction(-1 * offset)]
+    new_instructions = [AllocateStackAssemblyInstruction(stack_size)]
 
     for instr in instructions:
         if isinstance(instr, MovAssemblyInstruction) and isinstance(instr.src, Stack) and isinstance(instr.dst, Stack):
             new_instructions.extend([
-                MovAssemblyInstruction(instr.src, Reg(R10())),
-                MovAssemblyInstruction(Reg(R10()), instr.dst)
+                MovAssemblyInstruction(instr.src, R10_REG),
+                MovAssemblyInstruction(R10_REG, instr.dst)
             ])
         else:
             new_instructions.append(instr)
 
-    return AssemblyProgram(
-        AssemblyFunctionDefinition(
-            name=AssemblyIdentifier(program.function_definition.identifier.name_str), 
-            instructions=new_instructions
-        )
+    return AssemblyFunctionDefinition(
+        name=AssemblyIdentifier(name), 
+        instructions=new_instructions,
+        stack_size=stack_size
     )
 
+def translate(program, register_allocation: bool = False, fused: bool = False):
+    # program is a TackyProgram, or a list of DenseTackyPrograms (one per
+    # function) as returned by tacky.to_dense
+    functions = program.function_definitions if isinstance(program, TackyProgram) else program
+    return AssemblyProgram([translate_function(f, register_allocation, fused) for f in functions])
+
 # x = """int main(void) {
 #     return ~12;
 # }
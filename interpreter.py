@@ -0,0 +1,87 @@
+"""
+TACKY interpreter.
+
+Executes a TackyProgram (or the list of DenseTackyPrograms tacky.to_dense
+makes of one) directly and returns the value main returns, with the same
+32-bit two's-complement semantics as the generated code: constants are
+truncated to 32 bits as `movl` would, and Negate/Complement wrap around
+(-(-2147483648) == -2147483648).
+
+Nothing past tacky_translate is needed, so it doubles as a reference
+oracle for the optimizer and the backends, and as a fast way to evaluate
+many programs in one process:
+
+    for value in evaluate_batch(sources):
+        ...
+"""
+
+import compiler
+from tacky import *
+from optimizer import wrap_int32
+
+UNARY_EVALUATORS = {
+    TackyComplement: lambda value: wrap_int32(~value),
+    TackyNegate: lambda value: wrap_int32(-value),
+}
+
+DENSE_UNARY_EVALUATORS = {
+    OPERATOR_COMPLEMENT: UNARY_EVALUATORS[TackyComplement],
+    OPERATOR_NEGATE: UNARY_EVALUATORS[TackyNegate],
+}
+
+def interpret_function(function_definition: TackyFunctionDefinition):
+    evaluators = UNARY_EVALUATORS
+    values = {}
+
+    def load(val: TackyValue):
+        if isinstance(val, TackyConstant):
+            return wrap_int32(constant_value(val.int))
+        return values[val.identifier.name_str]
+
+    for instr in function_definition.instructions:
+        if isinstance(instr, TackyUnary):
+            values[instr.dst.identifier.name_str] = evaluators[type(instr.unary_operator)](load(instr.src))
+        elif isinstance(instr, TackyReturn):
+            return load(instr.val)
+    raise ValueError("Function ended without a return!")
+
+def interpret_dense(program: DenseTackyProgram):
+    # temporaries are dense ints, so their values live in a flat list
+    evaluators = DENSE_UNARY_EVALUATORS
+    values = [0] * program.temporary_count
+    rows = zip(program.opcodes, program.operators, program.src_kinds, program.src_values, program.dst_slots)
+    for opcode, operator, src_kind, src_value, dst_slot in rows:
+        value = wrap_int32(src_value) if src_kind == SRC_CONSTANT else values[src_value]
+        if opcode == OP_RETURN:
+            return value
+        values[dst_slot] = evaluators[operator](value)
+    raise ValueError("Function ended without a return!")
+
+def interpret(program, entry: str = "main"):
+    # functions cannot call each other yet, so only entry is executed
+    if isinstance(program, TackyProgram):
+        for function_definition in program.function_definitions:
+            if function_definition.identifier.name_str == entry:
+                return interpret_function(function_definition)
+    else:
+        for dense in program:
+            if dense.name == entry:
+                return interpret_dense(dense)
+    raise ValueError(f"No function named {entry}!")
+
+def evaluate_source(source: str, optimize: bool = False):
+    # lex, parse and lower one program, then interpret it
+    result = compiler.compile_source(source, stop_at="tacky", optimize=optimize)
+    return interpret(result.tacky_program)
+
+def evaluate_batch(sources, optimize: bool = False):
+    """
+    Evaluates every source in turn. Yields the returned value for each, or
+    the CompileError for sources that fail to compile, so one bad program
+    does not stop the batch.
+    """
+    for source in sources:
+        try:
+            yield evaluate_source(source, optimize=optimize)
+        except compiler.CompileError as e:
+            yield e
@@ -0,0 +1,62 @@
+"""
+In-memory execution of generated code.
+
+The program is encoded with the built-in encoder, copied into an anonymous
+mmap, made executable and called through ctypes as `int f(void)`. Nothing
+touches the filesystem and no process is spawned, which makes it cheap
+enough to run thousands of small programs in one process.
+
+The mapping is written first and then switched to read+execute, so it is
+never writable and executable at the same time.
+"""
+
+import ctypes
+import mmap
+import os
+
+import encoder
+from generator import AssemblyProgram
+
+# libc is already loaded into the interpreter; looking it up by name would
+# run ldconfig
+libc = ctypes.CDLL(None, use_errno=True)
+libc.mprotect.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int]
+libc.mprotect.restype = ctypes.c_int
+
+ENTRY_POINT = ctypes.CFUNCTYPE(ctypes.c_int)
+
+def call_function(code: bytes, offset: int = 0):
+    """
+    Calls the function at offset in code and returns its int result.
+    """
+    size = max(len(code), 1)
+    buffer = mmap.mmap(-1, size, prot=mmap.PROT_READ | mmap.PROT_WRITE)
+    try:
+        buffer.write(code)
+        anchor = ctypes.c_char.from_buffer(buffer)
+        try:
+            address = ctypes.addressof(anchor)
+            if libc.mprotect(address, size, mmap.PROT_READ | mmap.PROT_EXEC) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"mprotect failed: {os.strerror(errno)}")
+            return ENTRY_POINT(address + offset)()
+        finally:
+            # the mmap cannot be closed while ctypes holds a view of it
+            del anchor
+    finally:
+        buffer.close()
+
+def run_program(program: AssemblyProgram, entry: str = "main"):
+    """
+    Runs entry (main by default) and returns its return value, as a
+    signed 32-bit int.
+    """
+    code, symbols = encoder.encode_program(program)
+    offsets = dict(symbols)
+    if entry not in offsets:
+        raise ValueError(f"No function named {entry}!")
+    return call_function(bytes(code), offsets[entry])
+
+def exit_status(value: int):
+    # what a shell would see had the program been run as an executable
+    return value & 0xFF
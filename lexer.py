@@ -22,67 +22,193 @@ class Token:
         self.string = string
         self.token_type = token_type
 
+KEYWORDS = {
+    "int": TokenType.int_keyword,
+    "void": TokenType.void_keyword,
+    "return": TokenType.return_keyword,
+}
+
+# order matters: the first alternative that matches wins, so longer
+# operators have to come before their prefixes (e.g. "--" before "-")
+TOKEN_PATTERNS = [
+    ("whitespace", r"\s+"),
+    (TokenType.identifier, r"[a-zA-Z_]\w*\b"),
+    (TokenType.constant, r"[0-9]+\b"),
+    (TokenType.open_parenthesis, r"\("),
+    (TokenType.close_parenthesis, r"\)"),
+    (TokenType.open_brace, r"{"),
+    (TokenType.close_brace, r"}"),
+    (TokenType.semicolon, r";"),
+
+    (TokenType.tilde, r"~"),
+    (TokenType.two_hyphens, r"--"),
+    (TokenType.hyphen, r"-"),
+]
+
+def group_name(kind):
+    return kind if isinstance(kind, str) else kind.name
+
+MASTER_PATTERN = re.compile(
+    "|".join(f"(?P<{group_name(kind)}>{pattern})" for kind, pattern in TOKEN_PATTERNS)
+)
+
+GROUP_TO_TYPE = {
+    group_name(kind): kind for kind, _ in TOKEN_PATTERNS if isinstance(kind, TokenType)
+}
+
 def tokenize(program_input):
     tokens = []
+    append = tokens.append
+    match = MASTER_PATTERN.match
+    pos = 0
+    end = len(program_input)
+
+    while pos < end:
+        m = match(program_input, pos)
+        if m is None:
+            raise Exception('No token match found!')
+
+        ttype = GROUP_TO_TYPE.get(m.lastgroup)
+        if ttype is not None:
+            string = m.group()
+            if ttype is TokenType.identifier:
+                # keywords are matched as identifiers and reclassified here
+                ttype = KEYWORDS.get(string, ttype)
+            append(Token(string, ttype))
+
+        pos = m.end()
 
-    while len(program_input) != 0:
-        if program_input[0].isspace():
-            program_input = program_input.lstrip()
-        else:
-            matches = {
-                TokenType.identifier: re.search(r"[a-zA-Z_]\w*\b", program_input),
-                TokenType.constant: re.search(r"[0-9]+\b", program_input),
-                TokenType.int_keyword: re.search(r"int\b", program_input),
-                TokenType.void_keyword: re.search(r"void\b", program_input),
-                TokenType.return_keyword: re.search(r"return\b", program_input),
-                TokenType.open_parenthesis: re.search(r"\(", program_input),
-                TokenType.close_parenthesis: re.search(r"\)", program_input),
-                TokenType.open_brace: re.search(r"{", program_input),
-                TokenType.close_brace: re.search(r"}", program_input),
-                TokenType.semicolon: re.search(r";", program_input),
-
-                TokenType.tilde: re.search(r"~", program_input),
-                TokenType.hyphen: re.search(r"-", program_input),
-                TokenType.two_hyphens: re.search(r"--", program_input)
-            }
-
-            spans = {}
-
-            for key, value in matches.items():
-                # only keep potential matches
-                if value is not None:
-                    spans[key] = value.span()
-            
-            if not spans:
-                raise Exception('No token match found!')
-
-            lengths = {}
-
-            for key, value in spans.items():
-                # only keep matches from the beginning of the input
-                if value[0] == 0:
-                    lengths[key] = value[1] - value[0]
-
-            if not lengths:
-                raise Exception('No token match found!')
-
-            temp = max(lengths.values())
-            ttypes = [key for key in lengths if lengths[key] == temp]
-
-            if temp == 0:
-                raise Exception('No token match found!')
-
-            if len(ttypes) == 2:
-                if TokenType.identifier in ttypes:
-                    ttypes.remove(TokenType.identifier)
-                else:
-                    raise Exception('More than one token match found!')
-
-            ttype = ttypes[0]
-
-            token = Token(matches[ttype].group(), ttype)
-            tokens.append(token)
-
-            program_input = program_input[spans[ttype][1]:]
- 
     return tokens
+
+def iter_tokens(program_input):
+    """
+    Yields the tokens tokenize would return, one at a time, so that only the
+    tokens the consumer still holds are alive. program_input is a str, or
+    bytes-like (e.g. an mmap) for files read in place.
+    """
+    if isinstance(program_input, str):
+        match = MASTER_PATTERN.match
+        decode = None
+    else:
+        match = BYTES_PATTERN.match
+        decode = bytes.decode
+    pos = 0
+    end = len(program_input)
+
+    while pos < end:
+        m = match(program_input, pos)
+        if m is None:
+            raise Exception('No token match found!')
+
+        ttype = GROUP_TO_TYPE.get(m.lastgroup)
+        if ttype is not None:
+            string = m.group() if decode is None else decode(m.group())
+            if ttype is TokenType.identifier:
+                ttype = KEYWORDS.get(string, ttype)
+            yield Token(string, ttype)
+
+        pos = m.end()
+
+# Span-based lexing over memory-mapped files
+#
+# tokenize_file scans the bytes of a file in place and stores each token as
+# three array columns (kind, start offset, length) instead of one Token
+# object with its own copy of the lexeme. Lexeme text is only decoded when
+# the parser asks for it.
+
+import mmap
+from array import array
+
+BYTES_PATTERN = re.compile(MASTER_PATTERN.pattern.encode())
+
+BYTE_KEYWORDS = {keyword.encode(): ttype for keyword, ttype in KEYWORDS.items()}
+
+TYPES_BY_VALUE = {ttype.value: ttype for ttype in TokenType}
+
+class SpanToken:
+    # a view of one entry in a TokenStore, with the same interface as Token
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def token_type(self):
+        return TYPES_BY_VALUE[self.store.kinds[self.index]]
+
+    @property
+    def string(self):
+        return self.store.lexeme(self.index)
+
+class TokenStore:
+    def __init__(self, buffer, offset_typecode: str = "Q"):
+        self.buffer = buffer
+        self.kinds = array("B")
+        self.starts = array(offset_typecode)
+        self.lengths = array("I")
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self.kinds)
+        if not 0 <= index < len(self.kinds):
+            raise IndexError("token index out of range")
+        return SpanToken(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield SpanToken(self, index)
+
+    def lexeme(self, index: int):
+        start = self.starts[index]
+        return self.buffer[start:start + self.lengths[index]].decode()
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+def tokenize_buffer(buffer):
+    # the buffer is matched in place; only identifiers are sliced out, to
+    # look them up in the keyword table
+    store = TokenStore(buffer, "I" if len(buffer) < 1 << 32 else "Q")
+    kinds = store.kinds.append
+    starts = store.starts.append
+    lengths = store.lengths.append
+    match = BYTES_PATTERN.match
+    identifier = TokenType.identifier
+    pos = 0
+    end = len(buffer)
+
+    while pos < end:
+        m = match(buffer, pos)
+        if m is None:
+            raise Exception('No token match found!')
+
+        ttype = GROUP_TO_TYPE.get(m.lastgroup)
+        token_end = m.end()
+        if ttype is not None:
+            if ttype is identifier:
+                ttype = BYTE_KEYWORDS.get(buffer[pos:token_end], ttype)
+            kinds(ttype.value)
+            starts(pos)
+            lengths(token_end - pos)
+
+        pos = token_end
+
+    return store
+
+def map_file(filename: str):
+    # a read-only mapping of the file, or b"" for an empty one; the caller
+    # closes the mapping
+    with open(filename, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return b""
+
+def tokenize_file(filename: str):
+    return tokenize_buffer(map_file(filename))
@@ -0,0 +1,108 @@
+"""
+TACKY optimizations:
+
+constant folding        Unary(op, Constant(c), dst)       dst := Constant(op c)
+involution cancelling   Unary(op, Var(a), Var(b))         b := x
+                        with a = Unary(op, x)             (for op = Negate | Complement)
+dead code elimination   Unary(op, src, dst)               removed if dst is never used
+
+Example:
+
+Unary(Negate, Constant(8), Var("tmp.0"))
+Unary(Complement, Var("tmp.0"), Var("tmp.1"))    ->    Return(Constant(7))
+Return(Var("tmp.1"))
+
+"""
+
+from tacky import *
+
+def wrap_int32(value: int):
+    # reduce to a signed 32-bit two's-complement value
+    value &= 0xFFFFFFFF
+    if value & 0x80000000:
+        value -= 1 << 32
+    return value
+
+def fold_unary(op: TackyUnaryOperator, value: int):
+    if isinstance(op, TackyComplement):
+        return wrap_int32(~value)
+    elif isinstance(op, TackyNegate):
+        return wrap_int32(-value)
+
+def fold_constants(instructions: List[TackyInstruction]):
+    # every temporary is assigned exactly once, so whatever is known about
+    # it at its definition holds for all of its later uses
+    replacements = {}
+    definitions = {}
+    result = []
+
+    def resolve(val: TackyValue):
+        if isinstance(val, TackyVar):
+            return replacements.get(val.identifier.name_str, val)
+        return val
+
+    for instr in instructions:
+        if isinstance(instr, TackyUnary):
+            op = instr.unary_operator
+            src = resolve(instr.src)
+            dst_name = instr.dst.identifier.name_str
+
+            if isinstance(src, TackyConstant):
+                replacements[dst_name] = TackyConstant(fold_unary(op, constant_value(src.int)))
+                continue
+
+            # both operators are their own inverse: op(op(x)) == x
+            inner = definitions.get(src.identifier.name_str)
+            if inner is not None and type(inner[0]) is type(op):
+                replacements[dst_name] = inner[1]
+                continue
+
+            definitions[dst_name] = (op, src)
+            result.append(TackyUnary(op, src, instr.dst))
+        elif isinstance(instr, TackyReturn):
+            result.append(TackyReturn(resolve(instr.val)))
+            # anything after a return is unreachable
+            break
+
+    return result
+
+def eliminate_dead_code(instructions: List[TackyInstruction]):
+    used = set()
+    result = []
+
+    for instr in reversed(instructions):
+        if isinstance(instr, TackyUnary):
+            if instr.dst.identifier.name_str not in used:
+                continue
+            if isinstance(instr.src, TackyVar):
+                used.add(instr.src.identifier.name_str)
+        elif isinstance(instr, TackyReturn):
+            if isinstance(instr.val, TackyVar):
+                used.add(instr.val.identifier.name_str)
+        result.append(instr)
+
+    result.reverse()
+    return result
+
+def optimize_function(function_definition: TackyFunctionDefinition):
+    instructions = fold_constants(function_definition.instructions)
+    instructions = eliminate_dead_code(instructions)
+
+    return TackyFunctionDefinition(
+        identifier=function_definition.identifier,
+        instructions=instructions
+    )
+
+def optimize(program: TackyProgram):
+    return TackyProgram([optimize_function(f) for f in program.function_definitions])
+
+# x = """int main(void) {
+#     return ~-8;
+# }
+# """
+
+# t = tokenize(x)
+# p = parse_program(t)
+# a = optimize(tacky_translate(p))
+# for i in a.function_definitions[0].instructions:
+#     print(i)
@@ -1,7 +1,7 @@
 """
 AST Nodes:
 
-program = Program(function_definition)
+program = Program(function_definition*)
 function_definition = Function(identifier name, statement body)
 statement = Return(exp)
 exp = Constant(int) | Unary(unary_operator, exp)
@@ -10,53 +10,71 @@ unary_operator = Complement | Negate
 """
 
 class ASTNode:
-    pass
+    __slots__ = ()
 
 class Exp(ASTNode):
-    pass
+    __slots__ = ()
 
 class UnaryOperator:
-    pass
+    __slots__ = ()
 
 class Complement(UnaryOperator):
-    pass
+    __slots__ = ()
 
 class Negate(UnaryOperator):
-    pass
+    __slots__ = ()
 
 class Constant(Exp):
+    __slots__ = ("value",)
+
     def __init__(self, value: int):
         self.value = value
 
 class Unary(Exp):
+    __slots__ = ("unary_operator", "exp")
+
     def __init__(self, unary_operator: UnaryOperator, exp: Exp):
         self.unary_operator = unary_operator
         self.exp = exp
 
 class Statement(ASTNode):
-    pass
+    __slots__ = ()
 
 class ReturnStatement(Statement):
+    __slots__ = ("return_value",)
+
     def __init__(self, return_value: Exp):
         self.return_value = return_value
 
 class Identifier(ASTNode):
+    __slots__ = ("name_str",)
+
     def __init__(self, name_str: str):
         self.name_str = name_str
 
 class FunctionDefinition(ASTNode):
-    def __init__(self, name: Identifier, body: Statement):
+    __slots__ = ("name", "body", "token_span")
+
+    def __init__(self, name: Identifier, body: Statement, token_span: tuple = None):
         self.name = name
         self.body = body
+        # (start, end): the tokens[start:end] the function was parsed from
+        self.token_span = token_span
 
 class Program(ASTNode):
-    def __init__(self, function_definition: FunctionDefinition):
-        self.function_definition = function_definition
+    __slots__ = ("function_definitions",)
+
+    def __init__(self, function_definitions: list):
+        self.function_definitions = function_definitions
+
+# operators carry no state, so every use shares one instance
+COMPLEMENT = Complement()
+NEGATE = Negate()
 
 """
 Formal Grammar:
 
-<program> ::= <function>
+<program> ::= <function> { <function> }
 <function> ::= "int" <identifier> "(" "void" ")" "{" <statement> "}"
 <statement> ::= "return" <exp> ";"
 <exp> ::= <int> | <unop> <exp> | "(" <exp> ")"
@@ -68,93 +86,208 @@ Formal Grammar:
 
 # Recursive Descent Parsing
 
+import re
+import sys
+
 from lexer import *
 
-def take_token(tokens):
-    print(f"took {tokens[0].token_type}, {tokens[0].string}")
-    try:
-        x = tokens[0]
-        del tokens[0]
-        return x
-    except IndexError as e:
-        raise Exception("Invalid end of program!") from e
-
-def expect(expected: TokenType, tokens):
-    print(f"expected {expected}")
-    actual = take_token(tokens).token_type
-    if actual != expected:
-        raise Exception(f"Expected {expected} but found {actual}!")
-
-def parse_identifier(tokens):
+def print_trace(message: str):
+    print(message, file=sys.stderr)
+
+class TokenStream:
+    def __init__(self, tokens, trace: bool = False, log=print_trace):
+        self.tokens = tokens
+        self.pos = 0
+        self.trace = trace
+        self.log = log
+
+    def at_end(self):
+        return self.pos >= len(self.tokens)
+
+    def peek(self):
+        try:
+            return self.tokens[self.pos]
+        except IndexError as e:
+            raise Exception("Invalid end of program!") from e
+
+    def advance(self):
+        token = self.peek()
+        self.pos += 1
+        if self.trace:
+            self.log(f"took {token.token_type}, {token.string}")
+        return token
+
+    def expect(self, expected: TokenType):
+        if self.trace:
+            self.log(f"expected {expected}")
+        token = self.advance()
+        if token.token_type != expected:
+            raise Exception(f"Expected {expected} but found {token.token_type}!")
+        return token
+
+class LazyTokenStream(TokenStream):
+    # pulls tokens from an iterator (e.g. lexer.iter_tokens) as the parser
+    # consumes them, holding on to nothing but the next one; pos still counts
+    # tokens, so token spans work as with a list
+    def __init__(self, tokens, trace: bool = False, log=print_trace):
+        super().__init__(iter(tokens), trace=trace, log=log)
+        self.next_token = next(self.tokens, None)
+
+    def at_end(self):
+        return self.next_token is None
+
+    def peek(self):
+        if self.next_token is None:
+            raise Exception("Invalid end of program!")
+        return self.next_token
+
+    def advance(self):
+        token = self.peek()
+        self.next_token = next(self.tokens, None)
+        self.pos += 1
+        if self.trace:
+            self.log(f"took {token.token_type}, {token.string}")
+        return token
+
+def parse_identifier(tokens: TokenStream):
     # check if identifier
-    try:
-        if tokens[0].token_type != TokenType.identifier:
-            raise Exception(f"Invalid identifier: {tokens[0].string}!")
-    except IndexError as e:
-        raise Exception("Invalid end of program!")
-    identifier = take_token(tokens).string
+    if tokens.peek().token_type != TokenType.identifier:
+        raise Exception(f"Invalid identifier: {tokens.peek().string}!")
+    identifier = sys.intern(tokens.advance().string)
     return Identifier(identifier)
 
-def parse_int(tokens):
+# octal constants start with 0 and cannot contain an 8 or 9, which as
+# rejects too
+CONSTANT_PATTERN = re.compile(r"0[0-7]*|[1-9][0-9]*")
+
+# digits converted at once; int() refuses strings past a few thousand
+CONSTANT_CHUNK = 18
+
+def constant_value(constant):
+    """
+    The value of an integer constant modulo 2**64, read with C's rules: a
+    leading 0 makes it octal, as it does for the assembler that gets the
+    text. Only the low 32 bits ever reach the generated code. Values that
+    are already ints (e.g. folded ones) are returned as is.
+    """
+    if not isinstance(constant, str):
+        return constant
+    base = 8 if constant[0] == "0" else 10
+    if len(constant) <= CONSTANT_CHUNK:
+        return int(constant, base)
+    value = 0
+    for start in range(0, len(constant), CONSTANT_CHUNK):
+        chunk = constant[start:start + CONSTANT_CHUNK]
+        value = (value * base ** len(chunk) + int(chunk, base)) & 0xFFFFFFFFFFFFFFFF
+    return value
+
+def parse_int(tokens: TokenStream):
     # check if int
-    try:
-        if tokens[0].token_type != TokenType.constant:
-            raise Exception(f"Invalid constant: {tokens[0].string}!")
-    except IndexError as e:
-        raise Exception("Invalid end of program!")
-    int = take_token(tokens).string
+    if tokens.peek().token_type != TokenType.constant:
+        raise Exception(f"Invalid constant: {tokens.peek().string}!")
+    int = tokens.advance().string
+    if CONSTANT_PATTERN.fullmatch(int) is None:
+        raise Exception(f"Invalid constant: {int}!")
     return Constant(int)
 
-def parse_unary(tokens):
-    match tokens[0].token_type:
-        case TokenType.hyphen:
-            take_token(tokens)
-            return Unary(Negate(), parse_exp(tokens))
-        case TokenType.tilde:
-            take_token(tokens)
-            return Unary(Complement(), parse_exp(tokens))
-
-def parse_parenthesized_exp(tokens):
-    take_token(tokens)
-    inner_exp = parse_exp(tokens)
-    expect(TokenType.close_parenthesis, tokens)
-    return inner_exp
-
-def parse_exp(tokens):
-    val = None
-    match tokens[0].token_type:
-        case TokenType.constant:
-            val = parse_int(tokens)
-        case TokenType.tilde | TokenType.hyphen:
-            val = parse_unary(tokens)
-        case TokenType.open_parenthesis:
-            val = parse_parenthesized_exp(tokens)
-        case _:
+# prefix operators and the AST operator each one builds
+PREFIX_OPERATORS = {
+    TokenType.hyphen: NEGATE,
+    TokenType.tilde: COMPLEMENT,
+}
+
+# binary operators: token type -> (precedence, build(left, right) -> Exp)
+# higher precedence binds tighter, and all of them bind looser than the
+# prefix operators; the grammar has none yet
+BINARY_OPERATORS = {}
+
+# pending work on the explicit parse stack
+PREFIX_FRAME = 0
+BINARY_FRAME = 1
+PAREN_FRAME = 2
+
+def reduce_frames(stack: list, exp: Exp, min_precedence: int):
+    # fold pending prefix and binary operators into exp, stopping at an open
+    # parenthesis or a binary operator that binds looser than min_precedence
+    while stack:
+        frame = stack[-1]
+        if frame[0] == PREFIX_FRAME:
+            exp = Unary(frame[1], exp)
+        elif frame[0] == BINARY_FRAME and frame[1] >= min_precedence:
+            exp = frame[2](frame[3], exp)
+        else:
+            break
+        stack.pop()
+    return exp
+
+def parse_exp(tokens: TokenStream):
+    # precedence climbing with an explicit stack, so nesting depth is not
+    # limited by the Python recursion limit
+    stack = []
+
+    while True:
+        # operand position
+        token_type = tokens.peek().token_type
+        if token_type in PREFIX_OPERATORS:
+            tokens.advance()
+            stack.append((PREFIX_FRAME, PREFIX_OPERATORS[token_type]))
+            continue
+        elif token_type == TokenType.open_parenthesis:
+            tokens.advance()
+            stack.append((PAREN_FRAME,))
+            continue
+        elif token_type == TokenType.constant:
+            exp = parse_int(tokens)
+        else:
             raise Exception('No expression found!')
-    return val
 
-def parse_statement(tokens):
-    expect(TokenType.return_keyword, tokens)
+        # operator position
+        while True:
+            token_type = None if tokens.at_end() else tokens.peek().token_type
+            if token_type in BINARY_OPERATORS:
+                precedence, build = BINARY_OPERATORS[token_type]
+                exp = reduce_frames(stack, exp, precedence)
+                tokens.advance()
+                stack.append((BINARY_FRAME, precedence, build, exp))
+                break
+
+            exp = reduce_frames(stack, exp, -1)
+            if not stack:
+                return exp
+
+            # only an open parenthesis can be left on top of the stack
+            stack.pop()
+            tokens.expect(TokenType.close_parenthesis)
+
+def parse_statement(tokens: TokenStream):
+    tokens.expect(TokenType.return_keyword)
     return_val = parse_exp(tokens)
-    expect(TokenType.semicolon, tokens)
+    tokens.expect(TokenType.semicolon)
     return ReturnStatement(return_value=return_val)
 
-def parse_function(tokens):
-    expect(TokenType.int_keyword, tokens)
+def parse_function(tokens: TokenStream):
+    start = tokens.pos
+    tokens.expect(TokenType.int_keyword)
     identifier = parse_identifier(tokens)
-    expect(TokenType.open_parenthesis, tokens)
-    expect(TokenType.void_keyword, tokens)
-    expect(TokenType.close_parenthesis, tokens)
-    expect(TokenType.open_brace, tokens)
+    tokens.expect(TokenType.open_parenthesis)
+    tokens.expect(TokenType.void_keyword)
+    tokens.expect(TokenType.close_parenthesis)
+    tokens.expect(TokenType.open_brace)
     statement = parse_statement(tokens)
-    expect(TokenType.close_brace, tokens)
-    return FunctionDefinition(identifier, statement)
+    tokens.expect(TokenType.close_brace)
+    return FunctionDefinition(identifier, statement, (start, tokens.pos))
+
+def iter_functions(tokens, trace: bool = False, log=print_trace):
+    # yields each top-level function as soon as it is parsed; with a
+    # LazyTokenStream the tokens after it have not been lexed yet
+    if not isinstance(tokens, TokenStream):
+        tokens = TokenStream(tokens, trace=trace, log=log)
+    yield parse_function(tokens)
+    while not tokens.at_end():
+        yield parse_function(tokens)
 
-def parse_program(tokens):
-    function = parse_function(tokens)
-    if len(tokens) != 0:
-        raise Exception("Invalid end of program!")
-    return Program(function)
+def parse_program(tokens, trace: bool = False, log=print_trace):
+    return Program(list(iter_functions(tokens, trace=trace, log=log)))
 
 def print_program(program: Program, indent: int = 0):
     def print_indent(text):
@@ -163,26 +296,25 @@ def print_program(program: Program, indent: int = 0):
     print_indent("Program:")
     indent += 2
 
-    function_def = program.function_definition
+    for function_def in program.function_definitions:
+        print_indent(f"FunctionDefinition: {function_def.name.name_str}")
+        indent += 2
 
-    print_indent(f"FunctionDefinition: {function_def.name.name_str}")
-    indent += 2
+        body = function_def.body
 
-    body = function_def.body
+        print_indent("ReturnStatement:")
+        indent += 2
+        return_value = body.return_value
+        if isinstance(return_value, Constant):
+            print_indent(f"Constant: {return_value.value}")
+        elif isinstance(return_value, Identifier):
+            print_indent(f"Identifier: {return_value.name_str}")
+        else:
+            print_indent("Unknown return value.")
+        indent -= 4
 
-    print_indent("ReturnStatement:")
-    indent += 2
-    return_value = body.return_value
-    if isinstance(return_value, Constant):
-        print_indent(f"Constant: {return_value.value}")
-    elif isinstance(return_value, Identifier):
-        print_indent(f"Identifier: {return_value.name_str}")
-    else:
-        print_indent("Unknown return value.")
     indent -= 2
 
-    indent -= 4
-
 # x = """
 # int main(void) {
 #     return ~-2147483647;
@@ -194,6 +326,6 @@ def print_program(program: Program, indent: int = 0):
 # for i in t:
 #     print(f"'{i.string}' {i.token_type}")
 
-# p = parse_program(t)
+# p = parse_program(t, trace=True)
 
 # print_program(p)
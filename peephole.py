@@ -0,0 +1,132 @@
+"""
+Peephole optimizations over the assembly program, run after the fixup pass.
+
+Each rule looks at a window of up to N consecutive instructions (fewer near
+the end of the function) and returns the instructions to put in its place,
+or None if it does not apply. Rules are
+registered in RULES with the @rule decorator, so new ones can be added
+without touching generator.translate.
+
+rule                        before                          after
+-------------------------------------------------------------------------------
+zero_stack_allocation       subq $0, %rsp
+self_move                   movl a, a
+store_forwarding            movl $c, -4(%rbp)               movl $c, -4(%rbp)
+                            movl -4(%rbp), %r10d            movl $c, %r10d
+unary_in_return_register    notl -4(%rbp)                   movl -4(%rbp), %eax
+                            movl -4(%rbp), %eax             notl %eax
+                            ret                             ret
+dead_store                  movl a, -4(%rbp)                ...
+                            ... (no use of -4(%rbp))        ret
+                            ret
+
+"""
+
+from generator import *
+
+RULES = []
+
+def rule(window: int):
+    def register(fn):
+        RULES.append((fn.__name__, window, fn))
+        return fn
+    return register
+
+def same_operand(a: Operand, b: Operand):
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, Reg):
+        return type(a.reg) is type(b.reg)
+    elif isinstance(a, Stack):
+        return a.int == b.int
+    elif isinstance(a, Imm):
+        return a.value == b.value
+    elif isinstance(a, Pseudo):
+        return a.identifier == b.identifier
+
+def mentions(instr: AssemblyInstruction, operand: Operand):
+    if isinstance(instr, MovAssemblyInstruction):
+        return same_operand(instr.src, operand) or same_operand(instr.dst, operand)
+    elif isinstance(instr, UnaryAssemblyInstruction):
+        return same_operand(instr.operand, operand)
+    return False
+
+@rule(window=1)
+def zero_stack_allocation(window):
+    instr = window[0]
+    if isinstance(instr, AllocateStackAssemblyInstruction) and instr.int == 0:
+        return []
+
+@rule(window=1)
+def self_move(window):
+    instr = window[0]
+    if isinstance(instr, MovAssemblyInstruction) and same_operand(instr.src, instr.dst):
+        return []
+
+@rule(window=2)
+def store_forwarding(window):
+    if len(window) < 2:
+        return None
+    store, load = window
+    if (isinstance(store, MovAssemblyInstruction) and isinstance(store.dst, Stack)
+            and isinstance(store.src, (Imm, Reg))
+            and isinstance(load, MovAssemblyInstruction) and same_operand(load.src, store.dst)):
+        return [store, MovAssemblyInstruction(store.src, load.dst)]
+
+@rule(window=3)
+def unary_in_return_register(window):
+    if len(window) < 3:
+        return None
+    unary, load, ret = window
+    if (isinstance(unary, UnaryAssemblyInstruction) and isinstance(unary.operand, Stack)
+            and isinstance(load, MovAssemblyInstruction) and same_operand(load.src, unary.operand)
+            and isinstance(load.dst, Reg) and isinstance(ret, RetAssemblyInstruction)):
+        # the slot is dead once the frame is torn down, so the operation can
+        # happen in the register instead
+        return [MovAssemblyInstruction(load.src, load.dst), UnaryAssemblyInstruction(unary.unary_operator, load.dst), ret]
+
+@rule(window=4)
+def dead_store(window):
+    store = window[0]
+    if not (isinstance(store, MovAssemblyInstruction) and isinstance(store.dst, Stack)):
+        return None
+    for instr in window[1:]:
+        if isinstance(instr, RetAssemblyInstruction):
+            return window[1:]
+        if mentions(instr, store.dst):
+            return None
+
+def run_rules(instructions: List[AssemblyInstruction], rules=RULES, hits: dict = None):
+    if hits is None:
+        hits = {}
+    longest = max((window for _, window, _ in rules), default=1)
+    instructions = list(instructions)
+
+    i = 0
+    while i < len(instructions):
+        for name, window, fn in rules:
+            replacement = fn(instructions[i:i + window])
+            if replacement is not None:
+                instructions[i:i + window] = replacement
+                hits[name] = hits.get(name, 0) + 1
+                # a rewrite can enable a match that starts a little earlier
+                i = max(0, i - (longest - 1))
+                break
+        else:
+            i += 1
+
+    return instructions
+
+def optimize_function(function_definition: AssemblyFunctionDefinition, rules=RULES, hits: dict = None):
+    return AssemblyFunctionDefinition(
+        name=function_definition.name,
+        instructions=run_rules(function_definition.instructions, rules, hits),
+        stack_size=function_definition.stack_size
+    )
+
+def optimize(program: AssemblyProgram, rules=RULES, hits: dict = None):
+    return AssemblyProgram([optimize_function(f, rules, hits) for f in program.function_definitions])
+
+def format_hits(hits: dict):
+    # one "rule: count" line per rule, including those that never fired
+    return [f"{name}: {hits.get(name, 0)}" for name, _, _ in RULES]
@@ -0,0 +1,517 @@
+"""
+Compact binary serialization of the compiler's IRs.
+
+Token lists, the parser AST, TackyProgram and AssemblyProgram can be
+written to bytes and read back, so a build can stop after any stage and
+later resume from its result. No pickle: the format is a fixed layout of
+tags, varints and a string table.
+
+file        = MAGIC  version:u8  kind:u8  strings  body
+strings     = count:varint  { length:varint  utf-8 bytes }
+varint      = unsigned LEB128; signed values are zigzag-encoded first
+string      = varint index into the string table
+
+kind        body
+----------  ---------------------------------------------------------------
+KIND_TOKENS count { type:u8  [string] }           lexeme only for identifiers
+                                                  and constants
+KIND_AST    count { name:string  span  RETURN exp }
+            span = start+1:varint end:varint | 0  (0 when unknown)
+            exp  = { NEGATE | COMPLEMENT }  CONSTANT string
+KIND_TACKY  count { name:string  count { RETURN val | NEGATE val val
+                                         | COMPLEMENT val val } }
+            val  = INT signed | TEXT string | VAR string | TEMP n:varint
+                   (TEMP is the temporary "tmp.n", which would otherwise
+                   put one string per temporary in the table)
+KIND_ASM    count { name:string  stack_size:varint
+                    count { MOV op op | NEG op | NOT op | ALLOCATE signed
+                            | RET } }
+            op   = IMM_INT signed | IMM_TEXT string | REG u8 | STACK signed
+                   | PSEUDO_TEXT string | PSEUDO_INT signed
+
+Constants keep their source text ("010" is not 10 to the assembler), so
+values that are strings in the IR are stored as strings and ints as ints.
+Any change to the layout must bump VERSION; load rejects other versions.
+
+Loading builds one large graph of small objects with no cycles in it, so
+the garbage collector is paused while it runs; otherwise the collections
+triggered by the allocations alone take about as long as the decoding.
+"""
+
+import gc
+
+import lexer
+import parser
+import tacky
+import generator
+from lexer import TokenType
+
+MAGIC = b"CIR\x00"
+VERSION = 1
+
+KIND_TOKENS = 1
+KIND_AST = 2
+KIND_TACKY = 3
+KIND_ASM = 4
+
+# the stage whose result each kind of file holds (see compiler.STAGES)
+KIND_STAGES = {
+    KIND_TOKENS: "lex",
+    KIND_AST: "parse",
+    KIND_TACKY: "tacky",
+    KIND_ASM: "codegen",
+}
+
+# AST and TACKY tags
+RETURN = 0
+NEGATE = 1
+COMPLEMENT = 2
+CONSTANT = 3
+
+# value tags, for TACKY values and assembly operands
+INT = 0
+TEXT = 1
+VAR = 2
+TEMP = 3
+
+IMM_INT = 0
+IMM_TEXT = 1
+REG = 2
+STACK = 3
+PSEUDO_TEXT = 4
+PSEUDO_INT = 5
+
+# assembly instruction tags
+MOV = 0
+NEG = 1
+NOT = 2
+ALLOCATE = 3
+RET = 4
+
+# every other token type always has the same lexeme
+FIXED_LEXEMES = {
+    TokenType.int_keyword: "int",
+    TokenType.void_keyword: "void",
+    TokenType.return_keyword: "return",
+    TokenType.open_parenthesis: "(",
+    TokenType.close_parenthesis: ")",
+    TokenType.open_brace: "{",
+    TokenType.close_brace: "}",
+    TokenType.semicolon: ";",
+    TokenType.tilde: "~",
+    TokenType.hyphen: "-",
+    TokenType.two_hyphens: "--",
+}
+
+REGISTERS = [
+    generator.AX_REG,
+    generator.CX_REG,
+    generator.DX_REG,
+    generator.SI_REG,
+    generator.DI_REG,
+    generator.R8_REG,
+    generator.R9_REG,
+    generator.R10_REG,
+    generator.R11_REG,
+]
+
+REGISTER_CODES = {type(register.reg): code for code, register in enumerate(REGISTERS)}
+
+class Writer:
+    __slots__ = ("body", "strings", "string_indexes")
+
+    def __init__(self):
+        self.body = bytearray()
+        self.strings = []
+        self.string_indexes = {}
+
+    def byte(self, value: int):
+        self.body.append(value)
+
+    def varint(self, value: int):
+        body = self.body
+        while value >= 0x80:
+            body.append(value & 0x7F | 0x80)
+            value >>= 7
+        body.append(value)
+
+    def signed(self, value: int):
+        # zigzag: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+        self.varint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+    def string(self, text: str):
+        index = self.string_indexes.get(text)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(text)
+            self.string_indexes[text] = index
+        self.varint(index)
+
+    def getvalue(self, kind: int):
+        header = Writer()
+        header.body += MAGIC
+        header.byte(VERSION)
+        header.byte(kind)
+        header.varint(len(self.strings))
+        for text in self.strings:
+            encoded = text.encode()
+            header.varint(len(encoded))
+            header.body += encoded
+        return bytes(header.body + self.body)
+
+class Reader:
+    __slots__ = ("data", "pos", "strings")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+        self.strings = []
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        data = self.data
+        value = data[self.pos]
+        self.pos += 1
+        if value < 0x80:
+            return value
+        value &= 0x7F
+        shift = 7
+        while True:
+            part = data[self.pos]
+            self.pos += 1
+            value |= (part & 0x7F) << shift
+            if part < 0x80:
+                return value
+            shift += 7
+
+    def signed(self):
+        value = self.varint()
+        return -(value >> 1) - 1 if value & 1 else value >> 1
+
+    def string(self):
+        return self.strings[self.varint()]
+
+    def header(self):
+        # checks the magic and version, reads the string table and returns
+        # the kind
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise Exception("Not an IR file!")
+        self.pos = len(MAGIC)
+        version = self.byte()
+        if version != VERSION:
+            raise Exception(f"Unsupported IR version {version}, expected {VERSION}!")
+        kind = self.byte()
+        for _ in range(self.varint()):
+            length = self.varint()
+            self.strings.append(bytes(self.data[self.pos:self.pos + length]).decode())
+            self.pos += length
+        return kind
+
+# Tokens
+
+def write_tokens(writer: Writer, tokens):
+    writer.varint(len(tokens))
+    for token in tokens:
+        token_type = token.token_type
+        writer.byte(token_type.value)
+        if token_type not in FIXED_LEXEMES:
+            writer.string(token.string)
+
+def read_tokens(reader: Reader):
+    types = lexer.TYPES_BY_VALUE
+    fixed = FIXED_LEXEMES
+    tokens = []
+    for _ in range(reader.varint()):
+        token_type = types[reader.byte()]
+        lexeme = fixed.get(token_type)
+        tokens.append(lexer.Token(reader.string() if lexeme is None else lexeme, token_type))
+    return tokens
+
+# AST
+
+AST_OPERATOR_TAGS = {
+    parser.Negate: NEGATE,
+    parser.Complement: COMPLEMENT,
+}
+
+AST_OPERATORS = {
+    NEGATE: parser.NEGATE,
+    COMPLEMENT: parser.COMPLEMENT,
+}
+
+def write_exp(writer: Writer, exp: parser.Exp):
+    # operators outermost first, then the constant; iterative like the parser
+    while isinstance(exp, parser.Unary):
+        writer.byte(AST_OPERATOR_TAGS[type(exp.unary_operator)])
+        exp = exp.exp
+    writer.byte(CONSTANT)
+    writer.string(exp.value)
+
+def read_exp(reader: Reader):
+    operators = []
+    tag = reader.byte()
+    while tag != CONSTANT:
+        operators.append(AST_OPERATORS[tag])
+        tag = reader.byte()
+    exp = parser.Constant(reader.string())
+    for op in reversed(operators):
+        exp = parser.Unary(op, exp)
+    return exp
+
+def write_ast(writer: Writer, program: parser.Program):
+    writer.varint(len(program.function_definitions))
+    for function_definition in program.function_definitions:
+        writer.string(function_definition.name.name_str)
+        if function_definition.token_span is None:
+            writer.varint(0)
+        else:
+            start, end = function_definition.token_span
+            writer.varint(start + 1)
+            writer.varint(end)
+        writer.byte(RETURN)
+        write_exp(writer, function_definition.body.return_value)
+
+def read_ast(reader: Reader):
+    function_definitions = []
+    for _ in range(reader.varint()):
+        name = parser.Identifier(reader.string())
+        start = reader.varint()
+        token_span = None if start == 0 else (start - 1, reader.varint())
+        if reader.byte() != RETURN:
+            raise Exception("Invalid statement in IR file!")
+        body = parser.ReturnStatement(read_exp(reader))
+        function_definitions.append(parser.FunctionDefinition(name, body, token_span))
+    return parser.Program(function_definitions)
+
+# TACKY
+
+TACKY_OPERATOR_TAGS = {
+    tacky.TackyNegate: NEGATE,
+    tacky.TackyComplement: COMPLEMENT,
+}
+
+TACKY_OPERATORS = {
+    NEGATE: tacky.TACKY_NEGATE,
+    COMPLEMENT: tacky.TACKY_COMPLEMENT,
+}
+
+def temporary_number(name: str):
+    # n for "tmp.n" as tacky_translate names them, otherwise None
+    if name.startswith("tmp."):
+        digits = name[4:]
+        if digits.isdigit() and str(int(digits)) == digits:
+            return int(digits)
+    return None
+
+def write_value(writer: Writer, val: tacky.TackyValue):
+    if isinstance(val, tacky.TackyVar):
+        name = val.identifier.name_str
+        number = temporary_number(name)
+        if number is None:
+            writer.byte(VAR)
+            writer.string(name)
+        else:
+            writer.byte(TEMP)
+            writer.varint(number)
+    elif isinstance(val.int, str):
+        writer.byte(TEXT)
+        writer.string(val.int)
+    else:
+        writer.byte(INT)
+        writer.signed(val.int)
+
+def read_value(reader: Reader, identifiers: dict):
+    tag = reader.byte()
+    if tag == TEMP or tag == VAR:
+        # one identifier object per temporary, as tacky_translate makes
+        key = reader.varint() if tag == TEMP else reader.string()
+        identifier = identifiers.get(key)
+        if identifier is None:
+            name = f"tmp.{key}" if tag == TEMP else key
+            identifier = identifiers[key] = tacky.TackyIdentifier(name)
+        return tacky.TackyVar(identifier)
+    if tag == TEXT:
+        return tacky.TackyConstant(reader.string())
+    return tacky.TackyConstant(reader.signed())
+
+def write_tacky(writer: Writer, program: tacky.TackyProgram):
+    writer.varint(len(program.function_definitions))
+    for function_definition in program.function_definitions:
+        writer.string(function_definition.identifier.name_str)
+        writer.varint(len(function_definition.instructions))
+        for instr in function_definition.instructions:
+            if isinstance(instr, tacky.TackyReturn):
+                writer.byte(RETURN)
+                write_value(writer, instr.val)
+            else:
+                writer.byte(TACKY_OPERATOR_TAGS[type(instr.unary_operator)])
+                write_value(writer, instr.src)
+                write_value(writer, instr.dst)
+
+def read_tacky(reader: Reader):
+    function_definitions = []
+    for _ in range(reader.varint()):
+        name = tacky.TackyIdentifier(reader.string())
+        identifiers = {}
+        instructions = []
+        for _ in range(reader.varint()):
+            tag = reader.byte()
+            if tag == RETURN:
+                instructions.append(tacky.TackyReturn(read_value(reader, identifiers)))
+            else:
+                src = read_value(reader, identifiers)
+                dst = read_value(reader, identifiers)
+                instructions.append(tacky.TackyUnary(TACKY_OPERATORS[tag], src, dst))
+        function_definitions.append(tacky.TackyFunctionDefinition(name, instructions))
+    return tacky.TackyProgram(function_definitions)
+
+# Assembly
+
+def write_operand(writer: Writer, op: generator.Operand):
+    if isinstance(op, generator.Reg):
+        writer.byte(REG)
+        writer.byte(REGISTER_CODES[type(op.reg)])
+    elif isinstance(op, generator.Stack):
+        writer.byte(STACK)
+        writer.signed(op.int)
+    elif isinstance(op, generator.Imm):
+        if isinstance(op.value, str):
+            writer.byte(IMM_TEXT)
+            writer.string(op.value)
+        else:
+            writer.byte(IMM_INT)
+            writer.signed(op.value)
+    elif isinstance(op, generator.Pseudo):
+        if isinstance(op.identifier, str):
+            writer.byte(PSEUDO_TEXT)
+            writer.string(op.identifier)
+        else:
+            writer.byte(PSEUDO_INT)
+            writer.signed(op.identifier)
+
+def read_operand(reader: Reader):
+    tag = reader.byte()
+    if tag == REG:
+        return REGISTERS[reader.byte()]
+    if tag == STACK:
+        return generator.Stack(reader.signed())
+    if tag == IMM_TEXT:
+        return generator.Imm(reader.string())
+    if tag == IMM_INT:
+        return generator.Imm(reader.signed())
+    if tag == PSEUDO_TEXT:
+        return generator.Pseudo(reader.string())
+    if tag == PSEUDO_INT:
+        return generator.Pseudo(reader.signed())
+    raise Exception(f"Invalid operand tag {tag} in IR file!")
+
+ASM_UNARY_TAGS = {
+    generator.Neg: NEG,
+    generator.Not: NOT,
+}
+
+ASM_UNARY_OPERATORS = {
+    NEG: generator.NEG,
+    NOT: generator.NOT,
+}
+
+def write_asm(writer: Writer, program: generator.AssemblyProgram):
+    writer.varint(len(program.function_definitions))
+    for function_definition in program.function_definitions:
+        writer.string(function_definition.name.value)
+        writer.varint(function_definition.stack_size)
+        writer.varint(len(function_definition.instructions))
+        for instr in function_definition.instructions:
+            if isinstance(instr, generator.MovAssemblyInstruction):
+                writer.byte(MOV)
+                write_operand(writer, instr.src)
+                write_operand(writer, instr.dst)
+            elif isinstance(instr, generator.UnaryAssemblyInstruction):
+                writer.byte(ASM_UNARY_TAGS[type(instr.unary_operator)])
+                write_operand(writer, instr.operand)
+            elif isinstance(instr, generator.AllocateStackAssemblyInstruction):
+                writer.byte(ALLOCATE)
+                writer.signed(instr.int)
+            elif isinstance(instr, generator.RetAssemblyInstruction):
+                writer.byte(RET)
+
+def read_asm(reader: Reader):
+    function_definitions = []
+    for _ in range(reader.varint()):
+        name = generator.AssemblyIdentifier(reader.string())
+        stack_size = reader.varint()
+        instructions = []
+        for _ in range(reader.varint()):
+            tag = reader.byte()
+            if tag == MOV:
+                src = read_operand(reader)
+                instructions.append(generator.MovAssemblyInstruction(src, read_operand(reader)))
+            elif tag == ALLOCATE:
+                instructions.append(generator.AllocateStackAssemblyInstruction(reader.signed()))
+            elif tag == RET:
+                instructions.append(generator.RetAssemblyInstruction())
+            else:
+                instructions.append(generator.UnaryAssemblyInstruction(ASM_UNARY_OPERATORS[tag], read_operand(reader)))
+        function_definitions.append(generator.AssemblyFunctionDefinition(name, instructions, stack_size))
+    return generator.AssemblyProgram(function_definitions)
+
+WRITERS = {
+    KIND_TOKENS: write_tokens,
+    KIND_AST: write_ast,
+    KIND_TACKY: write_tacky,
+    KIND_ASM: write_asm,
+}
+
+READERS = {
+    KIND_TOKENS: read_tokens,
+    KIND_AST: read_ast,
+    KIND_TACKY: read_tacky,
+    KIND_ASM: read_asm,
+}
+
+def ir_kind(ir):
+    if isinstance(ir, (list, lexer.TokenStore)):
+        return KIND_TOKENS
+    if isinstance(ir, parser.Program):
+        return KIND_AST
+    if isinstance(ir, tacky.TackyProgram):
+        return KIND_TACKY
+    if isinstance(ir, generator.AssemblyProgram):
+        return KIND_ASM
+    raise ValueError(f"Cannot serialize {type(ir).__name__}!")
+
+def dump(ir):
+    kind = ir_kind(ir)
+    writer = Writer()
+    WRITERS[kind](writer, ir)
+    return writer.getvalue(kind)
+
+def load(data: bytes):
+    """
+    Returns (kind, ir); KIND_STAGES[kind] is the stage the IR came from.
+    """
+    reader = Reader(data)
+    kind = reader.header()
+    if kind not in READERS:
+        raise Exception(f"Unknown IR kind {kind}!")
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return kind, READERS[kind](reader)
+    finally:
+        if collecting:
+            gc.enable()
+
+def dump_file(ir, filename: str):
+    data = dump(ir)
+    with open(filename, "wb") as f:
+        f.write(data)
+    return len(data)
+
+def load_file(filename: str):
+    with open(filename, "rb") as f:
+        return load(f.read())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Persistent compile server.
+
+Keeps the compiler modules loaded and answers compile requests, one JSON
+object per line:
+
+request  = {"id": any, "path": str, "stage": str, "optimize": bool}
+         | {"id": any, "source": str, "stage": str, "optimize": bool}
+response = {"id": any, "ok": true, "assembly": str | null}
+         | {"id": any, "ok": false, "error": str, "stage": str}
+
+"path" names a C file and "source" carries C text; both are run through
+the preprocessor. "stage" is one of the driver options (--lex, --parse,
+--tacky, --codegen, -S) or empty; "assembly" is null when the stage stops
+before emission.
+
+usage: python3 server.py                  serve on stdin/stdout
+       python3 server.py --socket PATH    serve on a Unix domain socket
+
+Every request is compiled with its own compiler.CompilationContext, so
+socket connections are served on separate threads.
+"""
+
+import json
+import os
+import socketserver
+import subprocess
+import sys
+
+import compiler
+
+# stage each driver option stops after
+STAGES = {
+    "--lex": "lex",
+    "--parse": "parse",
+    "--tacky": "tacky",
+    "--codegen": "codegen",
+    "-S": "assembly",
+    "": "assembly",
+}
+
+def preprocess(path=None, source=None):
+    # gcc must never read the server's own stdin, which carries the requests
+    if path is not None:
+        result = subprocess.run(["gcc", "-E", "-P", path], stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    else:
+        result = subprocess.run(["gcc", "-E", "-P", "-x", "c", "-"], input=source, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Preprocessing failed: {result.stderr.strip()}")
+    return result.stdout
+
+def handle_request(request: dict):
+    response = {}
+    if "id" in request:
+        response["id"] = request["id"]
+
+    try:
+        stage = request.get("stage", "")
+        if not isinstance(stage, str) or stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r}, expected one of {list(STAGES)}")
+        if request.get("path") is None and request.get("source") is None:
+            raise ValueError("Request has neither \"path\" nor \"source\"")
+        source = preprocess(path=request.get("path"), source=request.get("source"))
+        result = compiler.compile_source(
+            source,
+            stop_at=STAGES[stage],
+            optimize=request.get("optimize", False)
+        )
+        response["ok"] = True
+        response["assembly"] = result.assembly
+    except compiler.CompileError as e:
+        response["ok"] = False
+        response["stage"] = e.stage
+        response["error"] = e.message
+    except Exception as e:
+        response["ok"] = False
+        response["error"] = str(e)
+
+    return response
+
+def serve(infile, outfile):
+    for line in infile:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            response = {"ok": False, "error": f"Invalid request: {e}"}
+        else:
+            response = handle_request(request)
+        outfile.write(json.dumps(response) + "\n")
+        outfile.flush()
+
+class SocketTextWriter:
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode())
+
+    def flush(self):
+        self.wfile.flush()
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        infile = (line.decode() for line in self.rfile)
+        serve(infile, SocketTextWriter(self.wfile))
+
+def serve_socket(path):
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, CompileRequestHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+def main(argv):
+    if len(argv) == 2 and argv[0] == "--socket":
+        try:
+            serve_socket(argv[1])
+        except KeyboardInterrupt:
+            pass
+    elif not argv:
+        serve(sys.stdin, sys.stdout)
+    else:
+        print("usage: server.py [--socket PATH]", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,114 @@
+"""
+Per-phase instrumentation for the driver (--stats / --stats-json).
+
+A StatsRecorder times each phase of a compile (wall and CPU time), tracks
+the tracemalloc peak while the phase runs and keeps the size counters the
+phase reports, e.g.:
+
+with recorder.phase("lex") as sizes:
+    tokens = lexer.tokenize(source)
+    sizes["tokens"] = len(tokens)
+
+NULL_RECORDER accepts the same calls and records nothing, so the pipeline
+does not need to check whether stats are enabled.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import parser
+
+class PhaseStats:
+    __slots__ = ("name", "wall", "cpu", "peak_memory", "sizes")
+
+    def __init__(self, name: str, wall: float, cpu: float, peak_memory: int, sizes: dict):
+        self.name = name
+        self.wall = wall
+        self.cpu = cpu
+        self.peak_memory = peak_memory
+        self.sizes = sizes
+
+    def to_dict(self):
+        return {
+            "phase": self.name,
+            "wall_seconds": self.wall,
+            "cpu_seconds": self.cpu,
+            "peak_memory_bytes": self.peak_memory,
+            **self.sizes,
+        }
+
+class StatsRecorder:
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.phases = []
+        # running peaks of the phases still open, outermost first
+        self.open_peaks = []
+
+    @contextmanager
+    def phase(self, name: str):
+        sizes = {}
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            # phases can nest (stream runs inside assemble when piping);
+            # enclosing phases keep the peak reached before this reset
+            peak = tracemalloc.get_traced_memory()[1]
+            self.open_peaks = [max(open_peak, peak) for open_peak in self.open_peaks]
+            tracemalloc.reset_peak()
+            self.open_peaks.append(0)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield sizes
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            peak_memory = None
+            if self.trace_memory:
+                peak_memory = max(self.open_peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if started_tracing:
+                    tracemalloc.stop()
+            self.phases.append(PhaseStats(name, wall, cpu, peak_memory, sizes))
+
+    def to_list(self):
+        return [phase.to_dict() for phase in self.phases]
+
+class NullRecorder:
+    @contextmanager
+    def phase(self, name: str):
+        yield {}
+
+NULL_RECORDER = NullRecorder()
+
+def count_ast_nodes(node):
+    # walks every slot of every node, iteratively so deep trees are fine
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, parser.ASTNode):
+            count += 1
+            for cls in type(node).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    stack.append(getattr(node, name))
+    return count
+
+def format_phases(phases: list):
+    lines = [f"{'phase':<14} {'wall ms':>10} {'cpu ms':>10} {'peak KB':>10}  sizes"]
+    for phase in phases:
+        peak = "-" if phase["peak_memory_bytes"] is None else f"{phase['peak_memory_bytes'] / 1024:.1f}"
+        sizes = " ".join(
+            f"{key}={value}" for key, value in phase.items()
+            if key not in ("phase", "wall_seconds", "cpu_seconds", "peak_memory_bytes")
+        )
+        lines.append(
+            f"{phase['phase']:<14} {phase['wall_seconds'] * 1000:>10.2f} "
+            f"{phase['cpu_seconds'] * 1000:>10.2f} {peak:>10}  {sizes}"
+        )
+    return lines
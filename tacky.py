@@ -1,7 +1,7 @@
 """
 TACKY:
 
-program = Program(function_definition)
+program = Program(function_definition*)
 function_definition = Function(identifier, instruction* body)
 instruction = Return(val) | Unary(unary_operator, val src, val dst)
 val = Constant(int) | Var(identifier)
@@ -12,53 +12,71 @@ unary_operator = Complement | Negate
 from typing import List
 
 class TackyNode:
-    pass
+    __slots__ = ()
 
 class TackyIdentifier(TackyNode):
+    __slots__ = ("name_str",)
+
     def __init__(self, name_str: str):
         self.name_str = name_str
 
 class TackyInstruction(TackyNode):
-    pass
+    __slots__ = ()
 
 class TackyValue(TackyNode):
-    pass
+    __slots__ = ()
 
 class TackyConstant(TackyValue):
+    __slots__ = ("int",)
+
     def __init__(self, int: int):
         self.int = int
 
 class TackyVar(TackyValue):
+    __slots__ = ("identifier",)
+
     def __init__(self, identifier: TackyIdentifier):
         self.identifier = identifier
 
 class TackyReturn(TackyInstruction):
+    __slots__ = ("val",)
+
     def __init__(self, val: TackyValue):
         self.val = val
 
 class TackyUnaryOperator(TackyNode):
-    pass
+    __slots__ = ()
 
 class TackyComplement(TackyUnaryOperator):
-    pass
+    __slots__ = ()
 
 class TackyNegate(TackyUnaryOperator):
-    pass
+    __slots__ = ()
 
 class TackyUnary(TackyInstruction):
+    __slots__ = ("unary_operator", "src", "dst")
+
     def __init__(self, unary_operator: TackyUnaryOperator, src: TackyValue, dst: TackyValue):
         self.unary_operator = unary_operator
         self.src = src
         self.dst = dst
 
 class TackyFunctionDefinition(TackyNode):
+    __slots__ = ("identifier", "instructions")
+
     def __init__(self, identifier: TackyIdentifier, instructions: List[TackyInstruction]):
         self.identifier = identifier
         self.instructions = instructions
 
 class TackyProgram(TackyNode):
-    def __init__(self, function_definition: TackyFunctionDefinition):
-        self.function_definition = function_definition
+    __slots__ = ("function_definitions",)
+
+    def __init__(self, function_definitions: List[TackyFunctionDefinition]):
+        self.function_definitions = function_definitions
+
+# shared operator instances, as in parser.py
+TACKY_COMPLEMENT = TackyComplement()
+TACKY_NEGATE = TackyNegate()
 
 """
 AST                                             TACKY
@@ -76,47 +94,190 @@ Return(Unary(Negate,                            Unary(Negate, Constant(8), Var("
 
 from parser import *
 
-curr_tmp_val = -1
+class TemporaryCounter:
+    # one per compilation, so concurrent compilations do not share numbering
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = -1
 
-def make_temporary():
-    global curr_tmp_val
-    curr_tmp_val += 1
-    return TackyIdentifier(f"tmp.{str(curr_tmp_val)}")
+    def make_temporary(self):
+        self.value += 1
+        return TackyIdentifier(f"tmp.{str(self.value)}")
 
 def convert_unop(op: UnaryOperator):
     if isinstance(op, Complement):
-        return TackyComplement()
+        return TACKY_COMPLEMENT
     elif isinstance(op, Negate):
-        return TackyNegate()
+        return TACKY_NEGATE
+
+def emit_tacky(e: Exp, instructions: list, temporaries: TemporaryCounter):
+    # collect the operators on the way down and emit them innermost first,
+    # so deep nesting does not grow the Python stack
+    operators = []
+    while isinstance(e, Unary):
+        operators.append(e.unary_operator)
+        e = e.exp
 
-def emit_tacky(e: Exp, instructions: list):
     if isinstance(e, Constant):
-        return TackyConstant(e.value)
-    elif isinstance(e, Unary):
-        src = emit_tacky(e.exp, instructions)
-        dst_name = make_temporary()
+        val = TackyConstant(e.value)
+
+    for op in reversed(operators):
+        dst_name = temporaries.make_temporary()
         dst = TackyVar(dst_name)
-        tacky_op = convert_unop(e.unary_operator)
-        instructions.append(TackyUnary(tacky_op, src, dst))
-        return dst
+        tacky_op = convert_unop(op)
+        instructions.append(TackyUnary(tacky_op, val, dst))
+        val = dst
 
-def emit_tacky_return(r: ReturnStatement, instructions: List[TackyInstruction]):
-    instructions.append(TackyReturn(emit_tacky(r.return_value, instructions)))
+    return val
 
-def tacky_translate(p: Program):
+def emit_tacky_return(r: ReturnStatement, instructions: List[TackyInstruction], temporaries: TemporaryCounter):
+    instructions.append(TackyReturn(emit_tacky(r.return_value, instructions, temporaries)))
+
+def tacky_translate_function(f: FunctionDefinition, temporaries: TemporaryCounter):
     instrs = []
     emit_tacky_return(
-        p.function_definition.body, 
-        instrs
+        f.body, 
+        instrs,
+        temporaries
     )
 
-    return TackyProgram(
-        TackyFunctionDefinition(
-            identifier=TackyIdentifier(p.function_definition.name.name_str), 
-            instructions=instrs
-        )
+    return TackyFunctionDefinition(
+        identifier=TackyIdentifier(f.name.name_str), 
+        instructions=instrs
     )
 
+def tacky_translate(p: Program, temporaries: TemporaryCounter = None):
+    if temporaries is None:
+        temporaries = TemporaryCounter()
+
+    return TackyProgram([tacky_translate_function(f, temporaries) for f in p.function_definitions])
+
+"""
+Dense TACKY:
+
+A struct-of-arrays encoding of one TackyFunctionDefinition; a program is a
+list of them, one per function. Instruction i is
+(opcodes[i], operators[i], src_kinds[i], src_values[i], dst_slots[i]), and
+temporaries are numbered 0..temporary_count-1 instead of named "tmp.N".
+
+Return(val)                 OP_RETURN   OPERATOR_NONE   kind(val)   value(val)  NO_DST
+Unary(op, src, Var(dst))    OP_UNARY    operator(op)    kind(src)   value(src)  slot(dst)
+
+kind/value = SRC_CONSTANT, int  |  SRC_TEMPORARY, slot
+
+"""
+
+from array import array
+
+OP_RETURN = 0
+OP_UNARY = 1
+
+OPERATOR_NONE = 0
+OPERATOR_COMPLEMENT = 1
+OPERATOR_NEGATE = 2
+
+SRC_CONSTANT = 0
+SRC_TEMPORARY = 1
+
+NO_DST = -1
+
+class DenseTackyProgram:
+    __slots__ = ("name", "opcodes", "operators", "src_kinds", "src_values", "dst_slots", "temporary_count")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.opcodes = array("B")
+        self.operators = array("B")
+        self.src_kinds = array("B")
+        self.src_values = array("q")
+        self.dst_slots = array("q")
+        self.temporary_count = 0
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def append(self, opcode: int, operator: int, src_kind: int, src_value: int, dst_slot: int):
+        self.opcodes.append(opcode)
+        self.operators.append(operator)
+        self.src_kinds.append(src_kind)
+        self.src_values.append(src_value)
+        self.dst_slots.append(dst_slot)
+
+def dense_operator(op: TackyUnaryOperator):
+    if isinstance(op, TackyComplement):
+        return OPERATOR_COMPLEMENT
+    elif isinstance(op, TackyNegate):
+        return OPERATOR_NEGATE
+
+def to_dense_function(function_definition: TackyFunctionDefinition):
+    dense = DenseTackyProgram(function_definition.identifier.name_str)
+    slots = {}
+
+    def encode(val: TackyValue):
+        if isinstance(val, TackyConstant):
+            # the low 64 bits, signed to fit the column; movl only uses
+            # the low 32 of them
+            value = constant_value(val.int)
+            if value >= 1 << 63:
+                value -= 1 << 64
+            return SRC_CONSTANT, value
+        name = val.identifier.name_str
+        slot = slots.get(name)
+        if slot is None:
+            slot = len(slots)
+            slots[name] = slot
+        return SRC_TEMPORARY, slot
+
+    for instr in function_definition.instructions:
+        if isinstance(instr, TackyReturn):
+            kind, value = encode(instr.val)
+            dense.append(OP_RETURN, OPERATOR_NONE, kind, value, NO_DST)
+        elif isinstance(instr, TackyUnary):
+            kind, value = encode(instr.src)
+            _, dst = encode(instr.dst)
+            dense.append(OP_UNARY, dense_operator(instr.unary_operator), kind, value, dst)
+
+    dense.temporary_count = len(slots)
+    return dense
+
+def to_dense(program: TackyProgram):
+    return [to_dense_function(f) for f in program.function_definitions]
+
+DENSE_OPERATORS = {
+    OPERATOR_COMPLEMENT: TACKY_COMPLEMENT,
+    OPERATOR_NEGATE: TACKY_NEGATE,
+}
+
+def from_dense_function(dense: DenseTackyProgram):
+    identifiers = [TackyIdentifier(f"tmp.{slot}") for slot in range(dense.temporary_count)]
+
+    def decode(kind: int, value: int):
+        if kind == SRC_CONSTANT:
+            return TackyConstant(value)
+        return TackyVar(identifiers[value])
+
+    instructions = []
+    for opcode, operator, src_kind, src_value, dst_slot in zip(
+        dense.opcodes, dense.operators, dense.src_kinds, dense.src_values, dense.dst_slots
+    ):
+        if opcode == OP_RETURN:
+            instructions.append(TackyReturn(decode(src_kind, src_value)))
+        elif opcode == OP_UNARY:
+            instructions.append(TackyUnary(
+                DENSE_OPERATORS[operator],
+                decode(src_kind, src_value),
+                TackyVar(identifiers[dst_slot])
+            ))
+
+    return TackyFunctionDefinition(
+        identifier=TackyIdentifier(dense.name),
+        instructions=instructions
+    )
+
+def from_dense(dense_functions: List[DenseTackyProgram]):
+    return TackyProgram([from_dense_function(dense) for dense in dense_functions])
+
 # x = """int main(void) {
 #     return ~12;
 # }
@@ -132,7 +293,7 @@ def tacky_translate(p: Program):
 #  Unary(Negate, Constant(8)))))))
 # y = tacky_translate(x)
 
-# for i in y.function_definition.instructions:
+# for i in y.function_definitions[0].instructions:
 #     if isinstance(i, TackyUnary):
 #         print(i.src, i.dst)
 #     else: